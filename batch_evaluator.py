@@ -0,0 +1,123 @@
+"""
+Vectorized evaluation of many hands at once with numpy.
+
+evaluate_batch takes an (N, 5..7) array of card numbers (the same 0 to 51 encoding as Card.num) and
+returns the combo order and the strength of every row, equal to HandEvaluator.evaluate on that row.
+Every step works on whole columns: rank histograms, rank masks of the cards seen at least 1, 2, 3
+and 4 times, per-suit rank masks, and lookups into the 13-bit mask tables of hand_evaluator. The mask
+tables are numpy views of the table file of table_store when there is one, shared with the other processes.
+"""
+import numpy as np
+
+from hand_evaluator import CATEGORY_SHIFT, STRAIGHT_TABLE, HIGH_TABLE, FLUSH_TABLE, RANK_OF, pack_ranks, straight_ranks
+from table_store import stored_tables
+
+
+def _mask_tables():
+    # (straight, high, flush) as uint32 arrays, read in place from the mapped table file when there is one.
+    tables = stored_tables()
+    if tables is None:
+        return [np.array(table, dtype=np.uint32) for table in (STRAIGHT_TABLE, HIGH_TABLE, FLUSH_TABLE)]
+    tables = tables.numpy_view()
+    return [tables[name] for name in ('straight', 'high', 'flush')]
+
+
+_STRAIGHT, _HIGH, _FLUSH = _mask_tables()
+_RANK_INDEX = np.array([rank - 2 for rank in RANK_OF], dtype=np.int64)
+_RANK_WEIGHTS = 1 << np.arange(13, dtype=np.int64)
+# _RANK_BIT[rank] is the bit of a rank in a rank mask, 0 for the missing rank 0.
+_RANK_BIT = np.array([0, 0] + [1 << (rank - 2) for rank in range(2, 15)], dtype=np.int64)
+_STRAIGHT_STRENGTH = np.array([(4 << CATEGORY_SHIFT) | pack_ranks(straight_ranks(top)) if top >= 5 else 0
+                               for top in range(15)], dtype=np.int64)
+
+
+def _highest(mask):
+    # The highest rank in each rank mask, 0 for an empty mask.
+    return _HIGH[mask].astype(np.int64) >> 16
+
+
+def _top(mask, n):
+    # The n highest ranks in each rank mask, packed in the lowest 4 * n bits.
+    return _HIGH[mask].astype(np.int64) >> (4 * (5 - n))
+
+
+def _evaluate_chunk(nums):
+    n_hands, n_cards = nums.shape
+    rank_index = _RANK_INDEX[nums]
+    rows = np.repeat(np.arange(n_hands, dtype=np.int64) * 13, n_cards).reshape(n_hands, n_cards)
+    counts = np.bincount((rows + rank_index).ravel(), minlength=n_hands * 13).reshape(n_hands, 13)
+
+    present = (counts >= 1).astype(np.int64) @ _RANK_WEIGHTS
+    pairs = (counts >= 2).astype(np.int64) @ _RANK_WEIGHTS
+    trips = (counts >= 3).astype(np.int64) @ _RANK_WEIGHTS
+    quads = (counts >= 4).astype(np.int64) @ _RANK_WEIGHTS
+
+    quad_rank = _highest(quads)
+    trip_rank = _highest(trips)
+    pair_rank = _highest(pairs)
+    # The pair of a full house can come from a second three of a kind.
+    full_pair_rank = _highest(pairs & ~_RANK_BIT[trip_rank])
+    second_pair_rank = _highest(pairs & ~_RANK_BIT[pair_rank])
+    straight_top = _STRAIGHT[present].astype(np.int64)
+
+    conditions = [
+        quad_rank > 0,
+        (trip_rank > 0) & (full_pair_rank > 0),
+        straight_top > 0,
+        trip_rank > 0,
+        second_pair_rank > 0,
+        pair_rank > 0,
+    ]
+    choices = [
+        (7 << CATEGORY_SHIFT) | quad_rank * 0x11110 | _highest(present & ~_RANK_BIT[quad_rank]),
+        (6 << CATEGORY_SHIFT) | trip_rank * 0x11100 | full_pair_rank * 0x11,
+        _STRAIGHT_STRENGTH[straight_top],
+        (3 << CATEGORY_SHIFT) | trip_rank * 0x11100 | _top(present & ~_RANK_BIT[trip_rank], 2),
+        (2 << CATEGORY_SHIFT) | pair_rank * 0x11000 | second_pair_rank * 0x110
+        | _highest(present & ~_RANK_BIT[pair_rank] & ~_RANK_BIT[second_pair_rank]),
+        (1 << CATEGORY_SHIFT) | pair_rank * 0x11000 | _top(present & ~_RANK_BIT[pair_rank], 3),
+    ]
+    strengths = np.select(conditions, choices, default=_HIGH[present].astype(np.int64))
+
+    suits = nums // 13
+    bits = _RANK_BIT[rank_index + 2]
+    for suit in range(4):
+        suit_mask = np.bitwise_or.reduce(np.where(suits == suit, bits, 0), axis=1)
+        np.maximum(strengths, _FLUSH[suit_mask].astype(np.int64), out=strengths)
+    return strengths
+
+
+def evaluate_batch(card_nums, chunk_size=1 << 18):
+    """Return (orders, strengths) for an (N, 5..7) array of card numbers.
+
+    orders is an int8 array of combo orders (see ComboIdentifier.ALL_COMBOS) and strengths an int32
+    array comparable across rows. Rows are processed chunk_size at a time to bound the temporaries.
+    """
+    nums = np.asarray(card_nums, dtype=np.int64)
+    assert nums.ndim == 2 and 5 <= nums.shape[1] <= 7, 'Value Error: card_nums must have shape (N, 5..7)'
+    assert nums.size == 0 or (nums.min() >= 0 and nums.max() <= 51), 'Value Error: card numbers must be between 0 and 51'
+
+    strengths = np.empty(len(nums), dtype=np.int32)
+    for start in range(0, len(nums), chunk_size):
+        strengths[start:start + chunk_size] = _evaluate_chunk(nums[start:start + chunk_size])
+    orders = (strengths >> CATEGORY_SHIFT).astype(np.int8)
+    return orders, strengths
+
+
+def testing(number=100000, seed=0):
+    # evaluate_batch against HandEvaluator.evaluate row by row, for 5, 6 and 7 cards.
+    from hand_evaluator import HandEvaluator
+
+    evaluator = HandEvaluator()
+    rng = np.random.default_rng(seed)
+    for n_cards in (5, 6, 7):
+        nums = np.argsort(rng.random((number, 52)), axis=1)[:, :n_cards]
+        orders, strengths = evaluate_batch(nums, chunk_size=number // 3)
+        expected = [evaluator.evaluate(row) for row in nums.tolist()]
+        assert strengths.tolist() == expected, 'evaluate_batch differs for {} cards'.format(n_cards)
+        assert (orders == strengths >> CATEGORY_SHIFT).all()
+    print('{} hands of 5, 6 and 7 cards agree with HandEvaluator'.format(number))
+
+
+if __name__ == '__main__':
+    testing()
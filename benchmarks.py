@@ -0,0 +1,242 @@
+"""
+Reproducible benchmarks for the card primitives and the combo identifier.
+
+Every benchmark builds its inputs and their state (decks, caches) from a seeded random.Random, afresh
+for each repetition, times each call on its own and reports the median throughput of the repetitions,
+their spread and the latency percentiles of the median one. Results can be saved as a JSON baseline and
+compared with a later run, a drop only counting as a regression beyond the spread of both runs:
+
+    python benchmarks.py --save baseline.json
+    python benchmarks.py --compare baseline.json --filter find_high_combo
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from cards_property import Card, Cards, Deck
+from evaluation_cache import EvaluationCache
+from rng_streams import derive_seed
+from texus_combo_identifier import ComboIdentifier
+
+PERCENTILES = (50, 90, 99)
+LEGACY_METHODS = [
+    'isStraight', 'find_high_straight', 'isFlush', 'find_high_flush', 'isStraightFlush', 'find_high_straight_flush',
+    'isFourOfaKind', 'find_high_four_of_a_kind', 'isFullHouse', 'find_high_full_house', 'isThreeOfaKind',
+    'find_high_three_of_a_kind', 'isTwoPair', 'find_high_two_pair', 'isPair', 'find_high_pair',
+]
+
+
+def random_nums(rng, n_cards):
+    return rng.sample(range(52), n_cards)
+
+
+def _call_each(function, inputs):
+    # Make a zero argument call for each input.
+    return [lambda args=args: function(*args) for args in inputs]
+
+
+def _card_benchmarks(number):
+    def names(rng):
+        nums = [rng.randrange(52) for i in range(number)]
+        return [(Card.SUITS[num // 13], Card.RANKS[num % 13]) for num in nums]
+
+    def shuffled_decks(rng):
+        decks = [Deck(rng) for i in range(number)]
+        for deck in decks:
+            deck.shuffle()
+        return decks
+
+    return {
+        'Card(num)': lambda rng: _call_each(Card, [(rng.randrange(52),) for i in range(number)]),
+        'Card(suit, rank)': lambda rng: [lambda suit=suit, rank=rank: Card(suit=suit, rank=rank)
+                                         for suit, rank in names(rng)],
+        'Deck()': lambda rng: [Deck] * number,
+        'Deck.shuffle': lambda rng: [deck.shuffle for deck in [Deck(rng) for i in range(number)]],
+        'Deck.draw(2)': lambda rng: [lambda deck=deck: deck.draw(2) for deck in shuffled_decks(rng)],
+        'Deck.distribute(6, 2)': lambda rng: [lambda deck=deck: deck.distribute(6, 2)
+                                              for deck in [Deck(rng) for i in range(number)]],
+    }
+
+
+def _identifier_benchmarks(number):
+    fast = ComboIdentifier()
+    legacy = ComboIdentifier(evaluator=False)
+
+    def hands_of(rng, n_cards):
+        return [Cards(cardnums=random_nums(rng, n_cards)) for i in range(number)]
+
+    def repeated(rng, identifier):
+        # Hands drawn again and again from a few hundred, with the suits relabelled, as in a simulation that
+        # revisits the same spots: the cache saves the evaluation and best_five on a hit.
+        pool = [random_nums(rng, 7) for i in range(200)]
+        hands = []
+        for i in range(number):
+            suits = rng.sample(range(4), 4)
+            hands.append(Cards(cardnums=[suits[num // 13] * 13 + num % 13 for num in rng.choice(pool)]))
+        # The caches are filled beforehand, the timings are the ones of a warm cache.
+        for hand in hands:
+            identifier.find_high_combo(hand)
+        return _call_each(identifier.find_high_combo, [(hand,) for hand in hands])
+
+    benchmarks = {}
+    for method in LEGACY_METHODS:
+        benchmarks['legacy.' + method] = lambda rng, method=method: _call_each(
+            getattr(legacy, method), [(hand,) for hand in hands_of(rng, 7)])
+    for n_cards in (5, 6, 7):
+        benchmarks['find_high_combo({})'.format(n_cards)] = lambda rng, n_cards=n_cards: _call_each(
+            fast.find_high_combo, [(hand,) for hand in hands_of(rng, n_cards)])
+        benchmarks['legacy.find_high_combo({})'.format(n_cards)] = lambda rng, n_cards=n_cards: _call_each(
+            legacy.find_high_combo, [(hand,) for hand in hands_of(rng, n_cards)])
+        benchmarks['evaluate({})'.format(n_cards)] = lambda rng, n_cards=n_cards: _call_each(
+            fast.evaluator.evaluate, [(random_nums(rng, n_cards),) for i in range(number)])
+    # A new cache for every repetition, so each one times the same warm cache.
+    benchmarks['find_high_combo(7, repeated)'] = lambda rng: repeated(rng, fast)
+    benchmarks['find_high_combo(7, repeated, cache)'] = lambda rng: repeated(
+        rng, ComboIdentifier(cache=EvaluationCache()))
+    benchmarks['find_high_combo(7, repeated, suit cache)'] = lambda rng: repeated(
+        rng, ComboIdentifier(cache=EvaluationCache(suit_isomorphism=True)))
+    # Far fewer calls, each one evaluates all 1081 ways of adding two cards to five.
+    benchmarks['find_possible_combos(5 to 7)'] = lambda rng: _call_each(
+        fast.find_possible_combos, [(Cards(cardnums=random_nums(rng, 5)), 7) for i in range(max(number // 200, 3))])
+    return benchmarks
+
+
+def build_benchmarks(seed=0, number=2000):
+    """Return {name: make}, make() building the zero argument calls of a benchmark and their state.
+
+    Each benchmark has its own random.Random seeded from the seed and its name, so make() returns the same
+    calls on fresh state every time, whichever benchmarks are run.
+    """
+    factories = _card_benchmarks(number)
+    factories.update(_identifier_benchmarks(number))
+    return {name: (lambda factory=factory, name=name: factory(random.Random(derive_seed(seed, name))))
+            for name, factory in factories.items()}
+
+
+def _percentile(sorted_values, percent):
+    index = min(int(round(percent / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(calls):
+    # Time every call and return the throughput (calls per second) and the latency percentiles in microseconds.
+    latencies = []
+    errors = 0
+    for call in calls:
+        start = time.perf_counter_ns()
+        try:
+            call()
+        except Exception:
+            # The legacy checks fail on a few hands, those calls still count in the timings.
+            errors += 1
+        latencies.append(time.perf_counter_ns() - start)
+    total = sum(latencies)
+    latencies.sort()
+    result = {
+        'calls': len(calls),
+        'errors': errors,
+        'throughput': len(calls) / (total / 1e9) if total else float('inf'),
+        'mean_us': total / len(calls) / 1e3,
+    }
+    for percent in PERCENTILES:
+        result['p{}_us'.format(percent)] = _percentile(latencies, percent) / 1e3
+    return result
+
+
+def measure_repeats(make, repeats=5, warmup=10):
+    """Measure repeats fresh sets of calls from make() and return the repetition of median throughput, with
+    the spread of the throughputs relative to the median as 'noise'.
+
+    The warmup calls run on a set of their own, so no timed call finds its state already used.
+    """
+    assert repeats > 0, 'Value Error: repeats must be positive'
+    for call in make()[:warmup]:
+        try:
+            call()
+        except Exception:
+            pass
+    runs = sorted((measure(make()) for repeat in range(repeats)), key=lambda result: result['throughput'])
+    result = dict(runs[len(runs) // 2])
+    result['repeats'] = repeats
+    result['noise'] = (runs[-1]['throughput'] - runs[0]['throughput']) / result['throughput']
+    return result
+
+
+def run(seed=0, number=2000, name_filter=None, repeats=5):
+    results = {}
+    for name, make in build_benchmarks(seed, number).items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = measure_repeats(make, repeats)
+    return {
+        'meta': {
+            'seed': seed,
+            'number': number,
+            'repeats': repeats,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=0.1):
+    # Return the names whose median throughput fell by more than threshold compared to the baseline, or by
+    # more than the noise of both runs when that is larger.
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['throughput'] / base['throughput']
+        result['baseline_ratio'] = ratio
+        if ratio < 1 - max(threshold, result.get('noise', 0) + base.get('noise', 0)):
+            regressions.append(name)
+    return regressions
+
+
+def format_report(report):
+    lines = ['{:<42} {:>12} {:>7} {:>10} {:>10} {:>10} {:>8}'.format(
+        'benchmark', 'calls/s', 'noise', 'p50 us', 'p90 us', 'p99 us', 'vs base')]
+    for name, result in report['results'].items():
+        ratio = result.get('baseline_ratio')
+        lines.append('{:<42} {:>12.0f} {:>6.0%} {:>10.2f} {:>10.2f} {:>10.2f} {:>8}'.format(
+            name, result['throughput'], result.get('noise', 0), result['p50_us'], result['p90_us'], result['p99_us'],
+            '' if ratio is None else '{:.2f}x'.format(ratio)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--number', type=int, default=2000, help='calls per benchmark')
+    parser.add_argument('--filter', default=None, help='only run the benchmarks whose name contains this')
+    parser.add_argument('--save', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='compare with a JSON baseline written by --save')
+    parser.add_argument('--repeats', type=int, default=5, help='repetitions per benchmark, the median is kept')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='smallest throughput drop reported as a regression, raised to the noise of the runs')
+    args = parser.parse_args(argv)
+
+    report = run(args.seed, args.number, args.filter, args.repeats)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+    print(format_report(report))
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2)
+    if regressions:
+        print('Regressions: {}'.format(', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,24 +7,38 @@ class Card:
             'rank':['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']}
     RANKS = CARD_DEF['rank']
     SUITS = CARD_DEF['suit']
+    # The 52 cards are created once below the class, Card() returns the shared instance of a card number.
+    # NUMS maps (suit, rank) strings to card numbers.
+    __slots__ = ('num', 'suit', 'rank')
+    INSTANCES = []
+    NUMS = {}
 
-    def __init__(self, num=-1, **properties):
+    def __new__(cls, num=-1, **properties):
         """Accept a number from 0 to 51 and convert it into suit and rank, or
         accept the suit and rank as strings to create a Card object."""
 
         if num < 0 or num > 51:
-            suit = properties.get('suit')
-            rank = str(properties.get('rank'))
-            if suit in self.SUITS and rank in self.RANKS:
-                self.num = self.SUITS.index(suit) * 13 + self.RANKS.index(rank)
+            num = cls.NUMS.get((properties.get('suit'), str(properties.get('rank'))))
+            assert num is not None, 'Value Error: suit must be in {} and rank in {}'.format(cls.SUITS, cls.RANKS)
+        return cls.INSTANCES[num]
+
+    @classmethod
+    def _intern(cls, num):
+        card = object.__new__(cls)
+        card.num = num
+        card.suit = num // 13
+        if num % 13 == 0: 
+            card.rank = 14
         else:
-            self.num = num
+            card.rank = num % 13 +1
+        return card
 
-        self.suit = self.num // 13
-        if self.num % 13 == 0: 
-            self.rank = 14
-        else:
-            self.rank = self.num % 13 +1
+    def __reduce__(self):
+        # Unpickle to the shared instance.
+        return (Card, (self.num,))
+
+    def __hash__(self):
+        return self.num
 
     # Comparison of cards. Only compare the ranks. 
     def __eq__(self, anotherCard):
@@ -52,12 +66,139 @@ class Card:
         return '{} {}'.format(self.SUITS[self.suit].rstrip('s'), self.RANKS[self.rank-1])
 
 
+Card.INSTANCES.extend(Card._intern(num) for num in range(52))
+Card.NUMS.update({(suit, rank): Card.SUITS.index(suit) * 13 + Card.RANKS.index(rank)
+                  for suit in Card.SUITS for rank in Card.RANKS})
+
+
+class CardSet:
+    # An immutable set of cards stored as a 52-bit integer, bit n is set when the card number n is in the set.
+    # Set algebra and counting work on the integer, Card objects are only created when the cards are asked for.
+    __slots__ = ('mask',)
+    FULL_MASK = (1 << 52) - 1
+    SUIT_MASKS = [((1 << 13) - 1) << (13 * suit) for suit in range(4)]
+    # RANK_MASKS[rank] for rank 2 to 14 (A = 14), the A is the first card of each suit.
+    RANK_MASKS = [0, 0] + [sum(1 << (suit * 13 + (rank - 1) % 13) for suit in range(4)) for rank in range(2, 15)]
+
+    def __init__(self, cards=None, mask=0):
+        # Accept an iterable of Card objects or card numbers, or the mask itself.
+        if cards is not None:
+            for card in cards:
+                mask |= 1 << (card.num if isinstance(card, Card) else card)
+        self.mask = mask
+
+    @classmethod
+    def full(cls):
+        return cls(mask=cls.FULL_MASK)
+
+    def nums(self):
+        # Return the card numbers in the set in increasing order.
+        nums = []
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            nums.append(low.bit_length() - 1)
+            mask ^= low
+        return nums
+
+    @property
+    def cards(self):
+        return [Card(num) for num in self.nums()]
+
+    def suit_count(self, suit):
+        return (self.mask & self.SUIT_MASKS[suit]).bit_count()
+
+    def rank_count(self, rank):
+        return (self.mask & self.RANK_MASKS[rank]).bit_count()
+
+    def __or__(self, anotherSet):
+        return CardSet(mask=self.mask | anotherSet.mask)
+
+    def __and__(self, anotherSet):
+        return CardSet(mask=self.mask & anotherSet.mask)
+
+    def __sub__(self, anotherSet):
+        return CardSet(mask=self.mask & ~anotherSet.mask)
+
+    def __contains__(self, card):
+        return self.mask >> (card.num if isinstance(card, Card) else card) & 1 == 1
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __eq__(self, anotherSet):
+        return isinstance(anotherSet, CardSet) and self.mask == anotherSet.mask
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return 'CardSet({})'.format(self.cards)
+
+
+class CardsAnalysis:
+    # A one pass summary of a collection of cards, shared by the checks of the combo identifier.
+    # rank_counts is indexed by rank (2 to 14), rank_mask and suit_rank_masks have rank 2 at bit 0.
+    # by_rank and by_suit list the cards of a rank from the highest suit and of a suit from the highest rank,
+    # they are only built when they are first used.
+    def __init__(self, cards, mask):
+        self.mask = mask
+        self.cards = cards
+        self.rank_counts = rank_counts = [0] * 15
+        self.suit_counts = suit_counts = [0] * 4
+        self.suit_rank_masks = suit_rank_masks = [0] * 4
+        for card in cards:
+            rank_counts[card.rank] += 1
+            suit_counts[card.suit] += 1
+            suit_rank_masks[card.suit] |= 1 << (card.rank - 2)
+        self.rank_mask = suit_rank_masks[0] | suit_rank_masks[1] | suit_rank_masks[2] | suit_rank_masks[3]
+        self._unique_ranks = None
+        self._by_rank = None
+        self._by_suit = None
+
+    @property
+    def unique_ranks(self):
+        if self._unique_ranks is None:
+            self._unique_ranks = [rank for rank, count in enumerate(self.rank_counts) if count]
+        return self._unique_ranks
+
+    def _sorted_cards(self):
+        return sorted(self.cards, key=lambda card: (card.rank, card.suit), reverse=True)
+
+    @property
+    def by_rank(self):
+        if self._by_rank is None:
+            self._by_rank = {}
+            for card in self._sorted_cards():
+                self._by_rank.setdefault(card.rank, []).append(card)
+        return self._by_rank
+
+    @property
+    def by_suit(self):
+        if self._by_suit is None:
+            self._by_suit = [[], [], [], []]
+            for card in self._sorted_cards():
+                self._by_suit[card.suit].append(card)
+        return self._by_suit
+
+
 class Cards():
     # The parent class for objects with more than one card.
     
-    def __init__(self,  cards=None, cardnums=[]):
-        # Accept a list of integer or a list of Card objects to create a card collection
-        if cards is None:
+    def __init__(self,  cards=None, cardnums=[], cardset=None):
+        # Accept a list of integer, a list of Card objects or a CardSet to create a card collection.
+        # A CardSet is only turned into Card objects when the cards are asked for.
+        self._cardset = None
+        if cardset is not None:
+            self._cards = None
+            self._cardset = cardset
+        elif cards is None:
             self.cards = [Card(i) for i in cardnums]
         else:
             assert (isinstance(cards, list) or isinstance(cards, tuple)), 'Type Error: cards must be a list or tuple'
@@ -66,9 +207,41 @@ class Cards():
                 cards = list(cards)
             self.cards = cards
 
+    @property
+    def cards(self):
+        if self._cards is None:
+            self._cards = self._cardset.cards
+            self._cardset = None
+        return self._cards
+
+    @cards.setter
+    def cards(self, cards):
+        self._cards = cards
+        self._cardset = None
+
+    @property
+    def cardset(self):
+        if self._cards is None:
+            return self._cardset
+        return CardSet(self._cards)
+
+    @property
+    def analysis(self):
+        # Computed once for the cards in the collection, it is only recomputed when the cards change.
+        cards = self._cards if self._cards is not None else self.cards
+        mask = 0
+        for card in cards:
+            mask |= 1 << card.num
+        analysis = getattr(self, '_analysis', None)
+        if analysis is None or analysis.mask != mask:
+            analysis = self._analysis = CardsAnalysis(list(cards), mask)
+        return analysis
+
     @property
     def size(self):
-        return len(self.cards)
+        if self._cards is None:
+            return len(self._cardset)
+        return len(self._cards)
     
     @property
     def ranks(self):
@@ -101,7 +274,7 @@ class Cards():
                 target = target.rank
             target = int(target)
             assert 2 <= target <= 14, 'Value Error: target must be between 2 and 14 (A = 14).'
-            return self.ranks.count(target)
+            return self.analysis.rank_counts[target]
         if key == 'suit':
             if isinstance(target, str):
                 suits_str = ['square', 'club', 'heart', 'spade']
@@ -109,16 +282,23 @@ class Cards():
                     target = suits_str.index(target.lower().rstrip('s'))
             target = int(target)
             assert 0 <= target <= 3, 'Value Error: target must be between 0 and 3.'
-            return self.suits.count(target) 
+            return self.analysis.suit_counts[target]
 
     def remove(self, anotherCards):
+        # Remove a Card, or every card of a Cards, CardSet or list, in one pass over the collection.
         if isinstance(anotherCards, Card):
-            if anotherCards in self.cards:
-                self.cards.remove(card)
-        for card in anotherCards:
-            if card in self.cards:
-                self.cards.remove(card)
-        
+            removed = CardSet([anotherCards])
+        elif isinstance(anotherCards, CardSet):
+            removed = anotherCards
+        elif isinstance(anotherCards, Cards):
+            removed = anotherCards.cardset
+        else:
+            removed = CardSet(anotherCards)
+        if self._cards is None:
+            self._cardset = self._cardset - removed
+        else:
+            self.cards = [card for card in self._cards if card.num not in removed]
+
 
     def __iter__(self):
         self.current_idx = 0
@@ -133,7 +313,7 @@ class Cards():
         return nxt
 
     def __len__(self):
-        return len(self.cards)
+        return self.size
 
     def __eq__(self, anotherCards):
         self.sort()
@@ -147,23 +327,32 @@ class Cards():
         return str(self.cards)
 
 
-class Deck(Cards):
-    # Create 52 cards by default. 
-    def __init__(self):
-        cardnums = [i for i in range(52)]
-        super().__init__(cardnums=cardnums)
+def card_nums(cards):
+    # Return the card numbers of None, a Cards, a CardSet or an iterable of Card objects or card numbers.
+    if cards is None:
+        return []
+    if isinstance(cards, CardSet):
+        return cards.nums()
+    if isinstance(cards, Cards):
+        cards = cards.cards
+    return [card.num if isinstance(card, Card) else int(card) for card in cards]
+
 
-    def shuffle(self):
-        random.shuffle(self.cards)
+class Deck(Cards):
+    # Create 52 cards by default. rng is the random.Random used to shuffle, the random module when None.
+    def __init__(self, rng=None):
+        super().__init__(cardset=CardSet.full())
+        self.rng = rng
+
+    def shuffle(self, rng=None):
+        rng = rng or self.rng or random
+        rng.shuffle(self.cards)
         return
 
     def draw(self, n_cards):
-        drawn = []
-        for i in range(n_cards):
-            try:
-                drawn.append(self.cards.pop(0))
-            except IndexError:
-                continue
+        assert n_cards <= self.size, 'Value Error: number of cards drawn fewer than cards in deck'
+        drawn = self.cards[:n_cards]
+        del self.cards[:n_cards]
         return Hand(drawn)
 
     def distribute(self, n_players, n_cards):
@@ -175,10 +364,63 @@ class Deck(Cards):
         return hands 
 
 
+class Dealer:
+    # A reusable deck of card numbers for simulations. The undealt cards are nums[cursor:], each deal shuffles
+    # only the cards it deals (a partial Fisher-Yates shuffle) and reset() puts the dealt cards back without
+    # building a new deck. Dead cards are left out of the deck.
+    def __init__(self, dead_cards=None, rng=None):
+        if rng is None:
+            rng = random.Random()
+        self.rng = rng
+        self.nums = []
+        self.dead = CardSet()
+        self.reset(dead_cards)
+
+    def reset(self, dead_cards=None):
+        # Put every card back, the deck is only rebuilt when the dead cards change.
+        if dead_cards is not None:
+            dead = CardSet(card_nums(dead_cards))
+            if dead != self.dead or not self.nums:
+                self.dead = dead
+                self.nums[:] = (CardSet.full() - dead).nums()
+        elif not self.nums:
+            self.nums[:] = (CardSet.full() - self.dead).nums()
+        self.cursor = 0
+
+    @property
+    def remaining(self):
+        return len(self.nums) - self.cursor
+
+    def deal_one(self):
+        nums = self.nums
+        cursor = self.cursor
+        assert cursor < len(nums), 'Value Error: no card left in the dealer'
+        swap = cursor + int(self.rng.random() * (len(nums) - cursor))
+        nums[cursor], nums[swap] = nums[swap], nums[cursor]
+        self.cursor = cursor + 1
+        return nums[cursor]
+
+    def deal(self, n_cards):
+        # Return the numbers of n_cards random undealt cards.
+        nums = self.nums
+        start = cursor = self.cursor
+        size = len(nums)
+        assert n_cards <= size - cursor, 'Value Error: number of cards drawn fewer than cards in dealer'
+        random_float = self.rng.random
+        for cursor in range(start, start + n_cards):
+            swap = cursor + int(random_float() * (size - cursor))
+            nums[cursor], nums[swap] = nums[swap], nums[cursor]
+        self.cursor = start + n_cards
+        return nums[start:self.cursor]
+
+    def deal_hand(self, n_cards):
+        return Hand(cardnums=self.deal(n_cards))
+
+
 class Hand(Cards):
-    def __init__(self, cards=None, cardnums=[]):
+    def __init__(self, cards=None, cardnums=[], cardset=None):
         if cards is None:
-            super().__init__(cardnums=cardnums)
+            super().__init__(cardnums=cardnums, cardset=cardset)
         else:
             self.cards = cards
 
@@ -0,0 +1,275 @@
+"""
+Equity of a hand against random opponent hands given a partial board.
+
+monte_carlo_equity samples runouts (the opponents' hole cards and the missing board cards) in chunks.
+Each chunk has its own random stream derived from the seed and the chunk index, so a result only depends
+on the seed and the chunks that ran, not on the number of workers. Chunks run on a process pool
+and the sampling stops early once the time or precision budget is met.
+
+exact_equity enumerates every runout for known hands instead. Suits that no known card uses are
+interchangeable, so the cards of those suits are only enumerated up to a permutation of the suits,
+each class weighted by its size, and the board key and suit masks of a prefix are shared by its runouts.
+"""
+import itertools
+import math
+import os
+import random
+import time
+from statistics import NormalDist
+
+from cards_property import CardSet, Dealer, card_nums
+from hand_evaluator import HandEvaluator, CARD_WEIGHT, RANK_BIT, get_rank_table, get_flush_table
+from isomorphism import free_suit_classes, class_size
+from process_pool import pool_map
+from rng_streams import RandomStreams
+
+
+class EquityResult:
+    def __init__(self, wins, ties, losses, share, share_squares, confidence=0.95, exact=False):
+        # share is the sum over runouts of the fraction of the pot won, share_squares the sum of its squares.
+        self.wins = wins
+        self.ties = ties
+        self.losses = losses
+        self.samples = wins + ties + losses
+        self.confidence = confidence
+        self.exact = exact
+        n = max(self.samples, 1)
+        self.win = wins / n
+        self.tie = ties / n
+        self.loss = losses / n
+        self.equity = share / n
+        self._variance = max(share_squares / n - self.equity ** 2, 0.0)
+
+    @property
+    def z(self):
+        return NormalDist().inv_cdf((1 + self.confidence) / 2)
+
+    def interval(self, rate):
+        # Wilson score interval of a rate (win, tie or loss) at the confidence of the result.
+        if self.exact or not self.samples:
+            return (rate, rate)
+        n, z = self.samples, self.z
+        centre = (rate + z * z / (2 * n)) / (1 + z * z / n)
+        half = z * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return (max(centre - half, 0.0), min(centre + half, 1.0))
+
+    @property
+    def win_interval(self):
+        return self.interval(self.win)
+
+    @property
+    def tie_interval(self):
+        return self.interval(self.tie)
+
+    @property
+    def loss_interval(self):
+        return self.interval(self.loss)
+
+    @property
+    def equity_margin(self):
+        # Half width of the normal interval of the equity.
+        if self.exact or not self.samples:
+            return 0.0
+        return self.z * math.sqrt(self._variance / self.samples)
+
+    def __repr__(self):
+        return 'EquityResult(win={:.4f}, tie={:.4f}, loss={:.4f}, equity={:.4f} +/- {:.4f}, samples={})'.format(
+            self.win, self.tie, self.loss, self.equity, self.equity_margin, self.samples)
+
+
+def _showdown(hero, opponents):
+    # Return the fraction of the pot won by hero against the opponents' strengths.
+    best = max(opponents)
+    if hero > best:
+        return 1.0
+    if hero < best:
+        return 0.0
+    return 1.0 / (opponents.count(best) + 1)
+
+
+def _run_chunk(hero, board, known, n_opponents, n_samples, seed):
+    # Sample n_samples runouts and return (wins, ties, losses, share, share_squares).
+    evaluate = HandEvaluator().evaluate
+    dealer = Dealer(dead_cards=known, rng=random.Random(seed))
+    n_board = 5 - len(board)
+    n_drawn = 2 * n_opponents + n_board
+    wins = ties = losses = 0
+    share = share_squares = 0.0
+    for sample in range(n_samples):
+        dealer.reset()
+        drawn = dealer.deal(n_drawn)
+        full_board = board + drawn[:n_board]
+        hero_strength = evaluate(hero + full_board)
+        opponents = [evaluate(drawn[index:index + 2] + full_board) for index in range(n_board, n_drawn, 2)]
+        won = _showdown(hero_strength, opponents)
+        if won == 1.0:
+            wins += 1
+        elif won == 0.0:
+            losses += 1
+        else:
+            ties += 1
+        share += won
+        share_squares += won * won
+    return wins, ties, losses, share, share_squares
+
+
+def monte_carlo_equity(hole_cards, board=None, dead_cards=None, n_opponents=1, n_samples=100000,
+                       seed=None, n_workers=None, chunk_size=5000, max_time=None, precision=None,
+                       confidence=0.95):
+    """Estimate the win/tie/loss rates of hole_cards against n_opponents random hands.
+
+    Runs up to n_samples runouts in chunks of chunk_size over n_workers processes (1 runs in this
+    process). Sampling stops early after max_time seconds or once the half width of the equity
+    interval is below precision.
+    """
+    hero = card_nums(hole_cards)
+    board = card_nums(board)
+    known = CardSet(hero) | CardSet(board) | CardSet(card_nums(dead_cards))
+    assert len(known) == len(hero) + len(board) + len(card_nums(dead_cards)), 'Value Error: cards are repeated'
+    assert len(hero) == 2, 'Value Error: hole_cards must have 2 cards'
+    assert len(board) <= 5, 'Value Error: board must have at most 5 cards'
+    assert n_opponents >= 1, 'Value Error: n_opponents must be at least 1'
+    assert 2 * n_opponents + 5 - len(board) <= 52 - len(known), 'Value Error: not enough cards left for the opponents'
+
+    streams = RandomStreams(seed)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_chunks = math.ceil(n_samples / chunk_size)
+    chunks = [(hero, board, known.nums(), n_opponents, min(chunk_size, n_samples - index * chunk_size),
+               streams.seed_of(index)) for index in range(n_chunks)]
+    start = time.monotonic()
+    totals = [0, 0, 0, 0.0, 0.0]
+
+    def add(counts):
+        for index, value in enumerate(counts):
+            totals[index] += value
+        return EquityResult(*totals, confidence=confidence)
+
+    def done(result):
+        if max_time is not None and time.monotonic() - start >= max_time:
+            return True
+        return precision is not None and result.equity_margin <= precision
+
+    result = EquityResult(*totals, confidence=confidence)
+    if n_workers == 1:
+        for chunk in chunks:
+            result = add(_run_chunk(*chunk))
+            if done(result):
+                break
+        return result
+
+    for counts in pool_map(_run_chunk, chunks, n_workers):
+        result = add(counts)
+        if done(result):
+            break
+    return result
+
+
+def exact_equity(hands, board=None, dead_cards=None):
+    """Return the exact EquityResult of every hand in hands by enumerating all the runouts of the board."""
+    hands = [card_nums(hand) for hand in hands]
+    board = card_nums(board)
+    dead = card_nums(dead_cards)
+    assert len(hands) >= 2, 'Value Error: at least 2 hands are needed'
+    assert all(len(hand) == 2 for hand in hands), 'Value Error: every hand must have 2 cards'
+    assert len(board) <= 5, 'Value Error: board must have at most 5 cards'
+    known = CardSet(board + dead + [num for hand in hands for num in hand])
+    assert len(known) == len(board) + len(dead) + 2 * len(hands), 'Value Error: cards are repeated'
+
+    used_suits = sorted(set(num // 13 for num in known.nums()))
+    free_suits = [suit for suit in range(4) if suit not in used_suits]
+    remaining = [num for num in (CardSet.full() - known).nums() if num // 13 in used_suits]
+    n_runout = 5 - len(board)
+    rank_table = get_rank_table()
+    flush_table = get_flush_table()
+
+    # Each hand's key and suit masks together with the known board cards.
+    bases = []
+    for hand in hands:
+        key = 0
+        masks = [0, 0, 0, 0]
+        for num in hand + board:
+            key += CARD_WEIGHT[num]
+            masks[num // 13] |= RANK_BIT[num]
+        bases.append((key, masks))
+
+    n_hands = len(hands)
+    wins = [0] * n_hands
+    ties = [0] * n_hands
+    share = [0.0] * n_hands
+    share_squares = [0.0] * n_hands
+    total = 0
+    for n_prefix in range(n_runout + 1):
+        free_runouts = [(masks, key, class_size(len(free_suits), counts))
+                        for masks, key, counts in free_suit_classes(len(free_suits), n_runout - n_prefix)]
+        if not free_runouts:
+            continue
+        for prefix in itertools.combinations(remaining, n_prefix):
+            prefix_key = 0
+            prefix_masks = [0, 0, 0, 0]
+            for num in prefix:
+                prefix_key += CARD_WEIGHT[num]
+                prefix_masks[num // 13] |= RANK_BIT[num]
+            # The flushes in the used suits do not depend on the free suit cards.
+            prefix_strengths = []
+            for key, masks in bases:
+                flush = 0
+                for suit in used_suits:
+                    flush = max(flush, flush_table[masks[suit] | prefix_masks[suit]])
+                prefix_strengths.append((key + prefix_key, flush))
+            for free_masks, free_key, weight in free_runouts:
+                free_flush = 0
+                for mask in free_masks:
+                    free_flush = max(free_flush, flush_table[mask])
+                strengths = [max(rank_table[key + free_key], flush, free_flush) for key, flush in prefix_strengths]
+                best = max(strengths)
+                winners = [index for index, strength in enumerate(strengths) if strength == best]
+                won = 1.0 / len(winners)
+                for index in winners:
+                    if len(winners) == 1:
+                        wins[index] += weight
+                    else:
+                        ties[index] += weight
+                    share[index] += won * weight
+                    share_squares[index] += won * won * weight
+                total += weight
+
+    return [EquityResult(wins[index], ties[index], total - wins[index] - ties[index], share[index],
+                         share_squares[index], exact=True) for index in range(n_hands)]
+
+
+def testing():
+    # exact_equity against a brute force over every runout, with 2 and 3 hands, paired boards and flush draws.
+    evaluator = HandEvaluator()
+    spots = [
+        ([[0, 13], [25, 24]], [1, 14, 27]),
+        ([[0, 13], [25, 24], [50, 49]], [3, 16]),
+        ([[0, 1], [30, 31]], [5, 18, 44, 45]),
+        ([[0, 13], [26, 39]], [2, 3, 4]),
+        ([[12, 11], [38, 37]], [10, 9, 22]),
+    ]
+    for hands, board in spots:
+        remaining = (CardSet.full() - CardSet(board + [num for hand in hands for num in hand])).nums()
+        wins = [0] * len(hands)
+        ties = [0] * len(hands)
+        share = [0.0] * len(hands)
+        runouts = 0
+        for runout in itertools.combinations(remaining, 5 - len(board)):
+            strengths = [evaluator.evaluate(hand + board + list(runout)) for hand in hands]
+            winners = [index for index, strength in enumerate(strengths) if strength == max(strengths)]
+            for index in winners:
+                if len(winners) == 1:
+                    wins[index] += 1
+                else:
+                    ties[index] += 1
+                share[index] += 1 / len(winners)
+            runouts += 1
+        results = exact_equity(hands, board)
+        for index, result in enumerate(results):
+            assert (result.wins, result.ties, result.samples) == (wins[index], ties[index], runouts), (hands, board)
+            assert abs(result.equity - share[index] / runouts) < 1e-9, (hands, board)
+    print('exact_equity agrees with the brute force on {} spots'.format(len(spots)))
+
+
+if __name__ == '__main__':
+    testing()
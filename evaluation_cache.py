@@ -0,0 +1,151 @@
+"""
+A bounded, thread safe memoization cache for hand strengths and best five cards.
+
+A strength alone is a table lookup, cheaper than a cache hit, so the cache is meant for best(): the
+strength together with the best five cards, which saves HandEvaluator.best_five as well (about five
+times the cost of the lookup). ComboIdentifier(cache=...) goes through best().
+
+Entries are keyed by the set of card numbers, so the order of the cards does not matter. With
+suit_isomorphism the key is the rank masks of the four suits sorted, which is the same for every
+relabelling of the suits and so shares one entry between all of them: the five cards are stored in the
+sorted suits and mapped back to the suits of the cards on a hit. When the hand holds more cards of the
+ranks of the five than the five use (a pair kicker out of two pairs, for instance), the choice of the
+suits is left to best_five, from the cached strength, to keep its order. The least recently used entry is
+evicted once the cache holds maxsize entries.
+"""
+import itertools
+import threading
+from collections import OrderedDict
+
+from hand_evaluator import HandEvaluator, RANK_OF
+
+# REMAPS[suits][num] maps a card number in the sorted suits back to the suits of the cards, with suits the
+# suit of the cards at each sorted index packed in 2 bits.
+REMAPS = [None] * 256
+for _suits in itertools.permutations(range(4)):
+    REMAPS[sum(suit << 2 * index for index, suit in enumerate(_suits))] = \
+        [_suits[num // 13] * 13 + num % 13 for num in range(52)]
+
+
+class EvaluationCache:
+    def __init__(self, maxsize=1 << 16, suit_isomorphism=False, evaluate=None, evaluator=None):
+        # evaluate(nums) computes a strength on a miss, evaluator.evaluate by default, and evaluator (a
+        # HandEvaluator by default) picks the best five cards.
+        assert maxsize > 0, 'Value Error: maxsize must be positive'
+        if evaluator is None:
+            evaluator = HandEvaluator()
+        self.maxsize = maxsize
+        self.suit_isomorphism = suit_isomorphism
+        self._evaluator = evaluator
+        self._evaluate = evaluate or evaluator.evaluate
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, nums):
+        # Return (key, suits), suits the suits of the cards in sorted order (see REMAPS), None without
+        # suit_isomorphism. The key is then the same for every relabelling of the suits.
+        mask = 0
+        for num in nums:
+            mask |= 1 << num
+        if not self.suit_isomorphism:
+            return mask, None
+        # The 13 bits of each suit in the card mask, with the suit in the 2 low bits, sorted.
+        first, second, third, fourth = sorted((mask << 2 & 0x7FFC, mask >> 11 & 0x7FFC | 1,
+                                               mask >> 24 & 0x7FFC | 2, mask >> 37 | 3))
+        key = first >> 2 | second >> 2 << 13 | third >> 2 << 26 | fourth >> 2 << 39
+        return key, first & 3 | (second & 3) << 2 | (third & 3) << 4 | (fourth & 3) << 6
+
+    def key(self, nums):
+        return self._key(nums)[0]
+
+    def _lookup(self, key):
+        # The entry [strength, five, choice] of a key (see best), None on a miss, counting the hits and misses.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evaluate(self, nums):
+        # Return the strength of the card numbers, from the cache when it is there.
+        key = self._key(nums)[0]
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[0]
+        # Evaluate outside the lock, two threads missing on the same key store the same entry.
+        strength = self._evaluate(nums)
+        self._store(key, [strength, None, None])
+        return strength
+
+    def best(self, nums):
+        # Return (strength, best five card numbers) of the card numbers, see HandEvaluator.best_five.
+        key, suits = self._key(nums)
+        entry = self._lookup(key)
+        if entry is None:
+            entry = [self._evaluate(nums), None, None]
+        elif entry[1] is not None:
+            strength, five, choice = entry
+            if choice is True:
+                return strength, self._evaluator.best_five(nums, strength)
+            if suits is None:
+                return strength, five
+            remap = REMAPS[suits]
+            five = [remap[num] for num in five]
+            if choice is not None:
+                # Cards of equal rank go from the highest suit (the highest number), as in best_five.
+                for start, end in choice:
+                    five[start:end] = sorted(five[start:end], reverse=True)
+            return strength, five
+        strength = entry[0]
+        five = self._evaluator.best_five(nums, strength)
+        ranks = [RANK_OF[num] for num in five]
+        # choice is True when the hand holds more cards of the ranks of the five than the five (the suits
+        # then depend on best_five's order), else the (start, end) of the runs of equal ranks in the five.
+        choice = None
+        if sum(1 for num in nums if RANK_OF[num] in ranks) > 5:
+            choice = True
+        elif len(set(ranks)) < 5:
+            choice = [(start, start + ranks.count(rank)) for start, rank in enumerate(ranks)
+                      if ranks.count(rank) > 1 and (start == 0 or ranks[start - 1] != rank)]
+        stored = five
+        if suits is not None:
+            position = [0] * 4
+            for index in range(4):
+                position[suits >> 2 * index & 3] = index
+            stored = [position[num // 13] * 13 + num % 13 for num in five]
+        self._store(key, [strength, stored, choice])
+        return strength, five
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
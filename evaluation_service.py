@@ -0,0 +1,282 @@
+"""
+An asyncio front end that evaluates hands for many concurrent callers in micro-batches.
+
+Callers await EvaluationService.evaluate(cards) and get a Combo back. Requests wait in a bounded queue
+until a batch of max_batch_size hands is collected or max_wait seconds have passed since the first hand
+of the batch, then the whole batch is evaluated in a thread or process pool with evaluate_batch (the
+scalar HandEvaluator when numpy is missing), so the event loop never runs an evaluation itself.
+
+Backpressure: evaluate waits while the queue holds max_queue requests, and at most max_in_flight
+batches are evaluated at the same time. metrics() reports the queue depth, the batch sizes and the
+latencies seen so far.
+
+    async with EvaluationService(max_batch_size=256, max_wait=0.002) as service:
+        combo = await service.evaluate(cards)
+"""
+import asyncio
+import collections
+import concurrent.futures
+import random
+import time
+
+from cards_property import Card, card_nums
+from hand_evaluator import HandEvaluator, CATEGORY_SHIFT
+from texus_combo_identifier import Combo
+
+_EVALUATOR = None
+
+
+def _get_evaluator():
+    # One HandEvaluator per process, built on its first batch.
+    global _EVALUATOR
+    if _EVALUATOR is None:
+        _EVALUATOR = HandEvaluator()
+    return _EVALUATOR
+
+
+def check_nums(nums):
+    # Raise a ValueError unless nums are 5 to 7 different card numbers.
+    if not 5 <= len(nums) <= 7:
+        raise ValueError('Value Error: a hand needs 5 to 7 cards, got {}'.format(len(nums)))
+    if any(not isinstance(num, int) or not 0 <= num <= 51 for num in nums):
+        raise ValueError('Value Error: card numbers must be between 0 and 51')
+    if len(set(nums)) != len(nums):
+        raise ValueError('Value Error: a card is repeated')
+
+
+def evaluate_rows(rows):
+    """Return [(best five card numbers, strength)] for rows of 5 to 7 card numbers, run in the pool, and the
+    number of rows evaluated by the scalar HandEvaluator instead of evaluate_batch.
+
+    A row that cannot be evaluated gets its exception in its place instead, the other rows are still evaluated.
+    """
+    try:
+        from batch_evaluator import evaluate_batch
+    except ImportError:
+        evaluate_batch = None
+    evaluator = _get_evaluator()
+    results = [None] * len(rows)
+    scalar_rows = 0
+    # Group the valid rows by length, evaluate_batch needs rows of one length.
+    by_length = {}
+    for index, row in enumerate(rows):
+        try:
+            check_nums(row)
+        except ValueError as error:
+            results[index] = error
+            continue
+        by_length.setdefault(len(row), []).append(index)
+    for indexes in by_length.values():
+        strengths = None
+        if evaluate_batch is not None:
+            try:
+                strengths = evaluate_batch([rows[index] for index in indexes])[1].tolist()
+            except ValueError:
+                # numpy refusing the rows: the scalar evaluator takes them, any other error is a bug and raises.
+                strengths = None
+        if strengths is None:
+            scalar_rows += len(indexes)
+        for position, index in enumerate(indexes):
+            try:
+                strength = strengths[position] if strengths is not None else evaluator.evaluate(rows[index])
+                results[index] = (evaluator.best_five(rows[index], strength), strength)
+            except Exception as error:
+                results[index] = error
+    return results, scalar_rows
+
+
+class EvaluationService:
+    def __init__(self, max_batch_size=256, max_wait=0.002, max_queue=10000, max_in_flight=4, executor=None,
+                 use_processes=False, n_workers=None):
+        # executor is any concurrent.futures executor, else a thread pool (process pool with use_processes)
+        # of n_workers is made on start and shut down on stop.
+        assert max_batch_size > 0, 'Value Error: max_batch_size must be positive'
+        assert max_wait >= 0, 'Value Error: max_wait cannot be negative'
+        assert max_queue > 0 and max_in_flight > 0, 'Value Error: max_queue and max_in_flight must be positive'
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.max_in_flight = max_in_flight
+        self.executor = executor
+        self.use_processes = use_processes
+        self.n_workers = n_workers
+        self._own_executor = False
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+        self._tasks = set()
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched_hands = 0
+        self.largest_batch = 0
+        self.scalar_hands = 0
+        self.peak_queue_depth = 0
+        self.in_flight = 0
+        # Latencies of the latest requests only, to keep the memory bounded.
+        self._latencies = collections.deque(maxlen=10000)
+
+    async def start(self):
+        assert self._batcher is None, 'Value Error: the service is already running'
+        if self.executor is None:
+            if self.use_processes:
+                self.executor = concurrent.futures.ProcessPoolExecutor(self.n_workers)
+            else:
+                self.executor = concurrent.futures.ThreadPoolExecutor(self.n_workers)
+            self._own_executor = True
+        self._queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._batcher = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        # Evaluate the requests still queued, then stop the batcher and the pool it made.
+        if self._batcher is None:
+            return
+        await self._queue.join()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._batcher = None
+        if self._own_executor:
+            self.executor.shutdown()
+            self.executor = None
+            self._own_executor = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.stop()
+
+    async def evaluate(self, cards):
+        # Return the best Combo of 5 to 7 cards (Cards, Card list or card numbers).
+        assert self._batcher is not None, 'Value Error: the service is not running'
+        nums = card_nums(cards)
+        # A bad hand fails here, on its caller, and never joins the batch of the other callers.
+        check_nums(nums)
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        # Wait here while the queue is full.
+        await self._queue.put((nums, future, time.perf_counter()))
+        self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        self.in_flight += 1
+        self.batches += 1
+        self.batched_hands += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            loop = asyncio.get_running_loop()
+            results, scalar_rows = await loop.run_in_executor(self.executor, evaluate_rows,
+                                                              [nums for nums, future, start in batch])
+        except Exception as error:
+            for nums, future, start in batch:
+                if not future.done():
+                    future.set_exception(error)
+            self.failed += len(batch)
+        else:
+            self.scalar_hands += scalar_rows
+            now = time.perf_counter()
+            for (nums, future, start), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    if not future.done():
+                        future.set_exception(result)
+                    self.failed += 1
+                    continue
+                five, strength = result
+                if not future.done():
+                    future.set_result(Combo([Card(num) for num in five], strength >> CATEGORY_SHIFT, strength))
+                self._latencies.append(now - start)
+                self.completed += 1
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            for item in batch:
+                self._queue.task_done()
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def metrics(self):
+        latencies = sorted(self._latencies)
+
+        def percentile(percent):
+            if not latencies:
+                return 0.0
+            return latencies[min(int(round(percent / 100 * (len(latencies) - 1))), len(latencies) - 1)] * 1e3
+
+        return {
+            'requests': self.requests,
+            'completed': self.completed,
+            'failed': self.failed,
+            'queue_depth': self.queue_depth(),
+            'peak_queue_depth': self.peak_queue_depth,
+            'in_flight_batches': self.in_flight,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_hands / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'scalar_hands': self.scalar_hands,
+            'p50_ms': percentile(50),
+            'p99_ms': percentile(99),
+        }
+
+
+async def _client(service, rng, n_requests, checker):
+    # A stand-in for a table client: bursts of requests with short pauses in between.
+    for request in range(n_requests):
+        nums = rng.sample(range(52), rng.choice((5, 6, 7)))
+        combo = await service.evaluate(nums)
+        assert combo.strength == checker.evaluate(nums), 'Value Error: the service disagrees with HandEvaluator'
+        if rng.random() < 0.1:
+            await asyncio.sleep(rng.random() * 0.001)
+
+
+def testing(n_clients=200, n_requests=50, use_processes=False):
+    async def main():
+        rng = random.Random(0)
+        checker = HandEvaluator()
+        async with EvaluationService(max_batch_size=128, max_wait=0.002, max_queue=256,
+                                     use_processes=use_processes) as service:
+            start = time.perf_counter()
+            await asyncio.gather(*(_client(service, random.Random(rng.random()), n_requests, checker)
+                                   for client in range(n_clients)))
+            elapsed = time.perf_counter() - start
+        print('{} requests in {:.2f}s'.format(n_clients * n_requests, elapsed))
+        print(service.metrics())
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    testing()
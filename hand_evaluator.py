@@ -0,0 +1,277 @@
+"""
+A table driven hand evaluator working directly on the card numbers (0 to 51) used by Card.
+
+The strength of a hand is a single integer. The combo order (see ComboIdentifier.ALL_COMBOS) is
+stored above CATEGORY_SHIFT and the ranks of the five cards, in order of significance, are packed
+in 4-bit fields below it, so comparing two strengths compares the two hands.
+
+Tables:
+    STRAIGHTS_TABLE[mask]: top ranks of every straight in a 13-bit rank mask from the highest, A2345 is 5.
+    STRAIGHT_TABLE[mask]: top rank of the highest straight in a rank mask, 0 if none.
+    HIGH_TABLE[mask]:     the five highest ranks of a rank mask, packed.
+    FLUSH_TABLE[mask]:    strength of the best flush or straight flush of one suit, 0 if fewer than 5 cards.
+    rank table:           strength of the best non-flush combo, keyed by the base-5 rank histogram
+                          of 1 to 7 cards (the sum of CARD_WEIGHT over the cards).
+"""
+import itertools
+
+CATEGORY_SHIFT = 20
+RANK_MASK_SIZE = 1 << 13
+
+# Per card number lookups, rank 2 is bit 0 and A (14) is bit 12 of a rank mask.
+RANK_OF = [14 if num % 13 == 0 else num % 13 + 1 for num in range(52)]
+SUIT_OF = [num // 13 for num in range(52)]
+RANK_BIT = [1 << (RANK_OF[num] - 2) for num in range(52)]
+CARD_WEIGHT = [5 ** (RANK_OF[num] - 2) for num in range(52)]
+
+
+def pack_ranks(ranks):
+    # Pack up to five ranks in order of significance, the first rank goes to the highest field.
+    packed = 0
+    for index, rank in enumerate(ranks[:5]):
+        packed |= rank << (16 - 4 * index)
+    return packed
+
+
+def unpack_ranks(strength):
+    # Return the ranks packed in a strength, in order of significance.
+    ranks = []
+    for shift in (16, 12, 8, 4, 0):
+        rank = (strength >> shift) & 0xF
+        if rank:
+            ranks.append(rank)
+    return ranks
+
+
+def category_of(strength):
+    return strength >> CATEGORY_SHIFT
+
+
+def mask_ranks(mask):
+    # Return the ranks present in a rank mask from the highest to the lowest.
+    return [bit + 2 for bit in range(12, -1, -1) if mask >> bit & 1]
+
+
+def straight_ranks(top):
+    # Return the ranks of the straight topped by top, the wheel ends with the A.
+    return [rank if rank > 1 else 14 for rank in range(top, top - 5, -1)]
+
+
+def _build_straights_table():
+    windows = [(top, sum(1 << (rank - 2) for rank in straight_ranks(top))) for top in range(14, 4, -1)]
+    return [tuple(top for top, window in windows if mask & window == window) for mask in range(RANK_MASK_SIZE)]
+
+
+def _build_straight_table(straights_table):
+    return [tops[0] if tops else 0 for tops in straights_table]
+
+
+def _build_high_table():
+    return [pack_ranks(mask_ranks(mask)) for mask in range(RANK_MASK_SIZE)]
+
+
+def _build_flush_table(straight_table, high_table):
+    table = [0] * RANK_MASK_SIZE
+    for mask in range(RANK_MASK_SIZE):
+        if bin(mask).count('1') < 5:
+            continue
+        top = straight_table[mask]
+        if top:
+            table[mask] = (8 << CATEGORY_SHIFT) | pack_ranks(straight_ranks(top))
+        else:
+            table[mask] = (5 << CATEGORY_SHIFT) | high_table[mask]
+    return table
+
+
+def rank_strength(counts, straight_table=None):
+    # Return the strength of the best non-flush combo given the number of cards of each rank.
+    # counts[0] is the number of 2s and counts[12] the number of As.
+    if straight_table is None:
+        straight_table = STRAIGHT_TABLE
+    mask = 0
+    for index, count in enumerate(counts):
+        if count:
+            mask |= 1 << index
+    by_rank = [(count, index + 2) for index, count in enumerate(counts) if count]
+    by_rank.reverse()
+    groups = sorted(by_rank, key=lambda group: group[0], reverse=True)
+
+    def kickers(excluded, n):
+        return [rank for count, rank in by_rank if rank not in excluded][:n]
+
+    top_count, top_rank = groups[0]
+    pairs = [rank for count, rank in by_rank if count >= 2 and rank != top_rank]
+    if top_count >= 4:
+        order, ranks = 7, [top_rank] * 4 + kickers([top_rank], 1)
+    elif top_count == 3 and pairs:
+        order, ranks = 6, [top_rank] * 3 + [pairs[0]] * 2
+    elif straight_table[mask]:
+        order, ranks = 4, straight_ranks(straight_table[mask])
+    elif top_count == 3:
+        order, ranks = 3, [top_rank] * 3 + kickers([top_rank], 2)
+    elif top_count == 2 and pairs:
+        order, ranks = 2, [top_rank] * 2 + [pairs[0]] * 2 + kickers([top_rank, pairs[0]], 1)
+    elif top_count == 2:
+        order, ranks = 1, [top_rank] * 2 + kickers([top_rank], 3)
+    else:
+        order, ranks = 0, kickers([], 5)
+    return (order << CATEGORY_SHIFT) | pack_ranks(ranks)
+
+
+def _key_counts(key):
+    counts = []
+    for rank in range(13):
+        key, count = divmod(key, 5)
+        counts.append(count)
+    return counts
+
+
+def _build_rank_table(straight_table, max_cards=7):
+    table = {}
+    for n_cards in range(1, max_cards + 1):
+        for indices in itertools.combinations_with_replacement(range(13), n_cards):
+            counts = [0] * 13
+            for index in indices:
+                counts[index] += 1
+            if max(counts) > 4:
+                continue
+            key = sum(5 ** index * count for index, count in enumerate(counts))
+            table[key] = rank_strength(counts, straight_table)
+    return table
+
+
+STRAIGHTS_TABLE = _build_straights_table()
+STRAIGHT_TABLE = _build_straight_table(STRAIGHTS_TABLE)
+HIGH_TABLE = _build_high_table()
+FLUSH_TABLE = _build_flush_table(STRAIGHT_TABLE, HIGH_TABLE)
+_RANK_TABLE = None
+_FLUSH_TABLE = None
+
+
+def get_rank_table():
+    # The rank table takes a moment to build, so it is only built the first time it is needed, and looked up
+    # in the table file written by table_store when there is one (shared by the processes, not copied).
+    global _RANK_TABLE
+    if _RANK_TABLE is None:
+        from table_store import stored_rank_table
+        _RANK_TABLE = stored_rank_table()
+        if _RANK_TABLE is None:
+            _RANK_TABLE = _build_rank_table(STRAIGHT_TABLE)
+    return _RANK_TABLE
+
+
+def get_flush_table():
+    # The flush table of the table file when there is one, else FLUSH_TABLE, looked up once like the rank table.
+    global _FLUSH_TABLE
+    if _FLUSH_TABLE is None:
+        from table_store import stored_tables
+        tables = stored_tables()
+        _FLUSH_TABLE = tables['flush'] if tables is not None else FLUSH_TABLE
+    return _FLUSH_TABLE
+
+
+class HandEvaluator:
+    def __init__(self):
+        self.rank_table = get_rank_table()
+        self.flush_table = get_flush_table()
+
+    def evaluate(self, nums):
+        # Return the strength of the best five cards among the card numbers.
+        key = 0
+        suit_masks = [0, 0, 0, 0]
+        card_weight = CARD_WEIGHT
+        rank_bit = RANK_BIT
+        for num in nums:
+            key += card_weight[num]
+            suit_masks[num // 13] |= rank_bit[num]
+        return self.lookup(key, suit_masks)
+
+    def lookup(self, key, suit_masks):
+        # Return the strength given the rank key (sum of CARD_WEIGHT) and the rank mask of each suit.
+        strength = self.rank_table.get(key)
+        if strength is None:
+            strength = self.rank_table[key] = rank_strength(_key_counts(key))
+        flush_table = self.flush_table
+        for mask in suit_masks:
+            flush = flush_table[mask]
+            if flush > strength:
+                strength = flush
+        return strength
+
+    def best_five(self, nums, strength=None):
+        # Return the card numbers of the best five cards, in the same order as ComboIdentifier.
+        # Cards of equal rank are taken from the highest suit first.
+        if strength is None:
+            strength = self.evaluate(nums)
+        ranks = unpack_ranks(strength)
+        candidates = sorted(nums, key=lambda num: (RANK_OF[num], SUIT_OF[num]), reverse=True)
+        if category_of(strength) in (5, 8):
+            for suit in range(4):
+                suit_cards = [num for num in candidates if SUIT_OF[num] == suit]
+                suit_mask = 0
+                for num in suit_cards:
+                    suit_mask |= RANK_BIT[num]
+                if self.flush_table[suit_mask] == strength:
+                    candidates = suit_cards
+                    break
+        five = []
+        for rank in ranks:
+            for num in candidates:
+                if RANK_OF[num] == rank and num not in five:
+                    five.append(num)
+                    break
+        return five
+
+
+def _reference_rank(five):
+    # Rank exactly five card numbers from the rules alone: (combo order, ranks in order of significance).
+    ranks = sorted((RANK_OF[num] for num in five), reverse=True)
+    counts = {rank: ranks.count(rank) for rank in ranks}
+    grouped = []
+    for rank in sorted(counts, key=lambda rank: (counts[rank], rank), reverse=True):
+        grouped += [rank] * counts[rank]
+    is_flush = len(set(SUIT_OF[num] for num in five)) == 1
+    top = 0
+    if len(counts) == 5 and ranks[0] - ranks[4] == 4:
+        top = ranks[0]
+    elif ranks == [14, 5, 4, 3, 2]:
+        top = 5
+    straight = [top, top - 1, top - 2, top - 3, top - 4 if top > 5 else 14]
+    pattern = sorted(counts.values(), reverse=True)
+    if top and is_flush:
+        return 8, straight
+    if pattern[0] == 4:
+        return 7, grouped
+    if pattern[:2] == [3, 2]:
+        return 6, grouped
+    if is_flush:
+        return 5, ranks
+    if top:
+        return 4, straight
+    if pattern[0] == 3:
+        return 3, grouped
+    if pattern[:2] == [2, 2]:
+        return 2, grouped
+    if pattern[0] == 2:
+        return 1, grouped
+    return 0, ranks
+
+
+def testing(number=20000, seed=0):
+    # HandEvaluator against the best five card rank of _reference_rank, on random hands and every straight flush.
+    import random
+
+    evaluator = HandEvaluator()
+    rng = random.Random(seed)
+    hands = [rng.sample(range(52), rng.choice([5, 6, 7])) for index in range(number)]
+    hands += [[suit * 13 + (rank - 1) % 13 for rank in straight_ranks(top)] for suit in range(4) for top in range(5, 15)]
+    for nums in hands:
+        strength = evaluator.evaluate(nums)
+        expected = max(_reference_rank(five) for five in itertools.combinations(nums, 5))
+        assert (category_of(strength), unpack_ranks(strength)) == expected, (nums, strength, expected)
+        assert _reference_rank(evaluator.best_five(nums, strength)) == expected, (nums, expected)
+    print('{} hands agree with the reference ranking'.format(len(hands)))
+
+
+if __name__ == '__main__':
+    testing()
@@ -0,0 +1,228 @@
+"""
+Bulk evaluation of hand-history files (JSON lines or CSV) across worker processes.
+
+Every record holds 5 to 7 cards in one or more fields (fields=('cards',) by default, for instance
+('hole', 'board')). A field is a list of card strings or one string of short cards:
+
+    {"id": 17, "hole": ["As", "Kd"], "board": "Qh Jh 10c 2s 2d"}
+    id,hole,board
+    17,AsKd,Qh Jh Tc 2s 2d
+
+Card strings are looked up in CARD_STRINGS, built once: the short form ('As', 'Td', '10d', suits s, h,
+c, d as in hand_range) and the long forms of Card ('A of Spades', 'Spade A'), in any case.
+
+The input is read chunk_size records at a time. Each chunk is parsed and evaluated in a worker process
+(evaluate_batch, or HandEvaluator without numpy), at most max_in_flight chunks are in the pool at once,
+and the results are written as soon as the oldest chunk is done, in the input order. Memory stays
+bounded by max_in_flight chunks whatever the size of the file.
+
+    python hand_history.py hands.jsonl results.jsonl --fields hole board --id-field id
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+from cards_property import Card
+from hand_evaluator import CATEGORY_SHIFT, RANK_OF, SUIT_OF
+from hand_range import RANK_CHARS, SUIT_CHARS, card_num
+from evaluation_service import evaluate_rows
+from process_pool import pool_map
+from texus_combo_identifier import ComboIdentifier
+
+SUIT_LETTERS = {suit: letter for letter, suit in SUIT_CHARS.items()}
+SHORT_CARD = re.compile(r'(10|[2-9tjqka])([dchs])', re.IGNORECASE)
+SEPARATORS = re.compile(r'[\s,;|/-]*')
+OUTPUT_FIELDS = ['line', 'id', 'combo', 'order', 'strength', 'best_five', 'error']
+
+
+def _card_strings():
+    strings = {}
+    for rank in range(2, 15):
+        for suit in range(4):
+            num = card_num(rank, suit)
+            card = Card(num)
+            for text in (RANK_CHARS[rank - 2] + SUIT_LETTERS[suit], str(card), repr(card)):
+                strings[text.lower()] = num
+            if rank == 10:
+                strings['10' + SUIT_LETTERS[suit]] = num
+    return strings
+
+
+# Every accepted card string, lower case, to its card number.
+CARD_STRINGS = _card_strings()
+
+
+def short_card(num):
+    return RANK_CHARS[RANK_OF[num] - 2] + SUIT_LETTERS[SUIT_OF[num]]
+
+
+def parse_cards(value):
+    # Return the card numbers of a list of card strings or of one string of short cards.
+    if isinstance(value, str):
+        if SEPARATORS.fullmatch(SHORT_CARD.sub('', value)) is None:
+            raise ValueError('Value Error: {!r} is not a list of cards'.format(value))
+        return [CARD_STRINGS[''.join(card).lower()] for card in SHORT_CARD.findall(value)]
+    nums = []
+    for text in value:
+        num = CARD_STRINGS.get(str(text).strip().lower())
+        if num is None:
+            raise ValueError('Value Error: {!r} is not a card'.format(text))
+        nums.append(num)
+    return nums
+
+
+def _record_nums(record, fields):
+    if not isinstance(record, dict):
+        raise ValueError('Value Error: a record must be an object, got {}'.format(type(record).__name__))
+    nums = []
+    for field in fields:
+        value = record.get(field)
+        if not value:
+            continue
+        if not isinstance(value, (str, list)):
+            raise ValueError('Value Error: field {} must be a string or a list of cards'.format(field))
+        nums.extend(parse_cards(value))
+    if not 5 <= len(nums) <= 7:
+        raise ValueError('Value Error: a hand needs 5 to 7 cards, got {}'.format(len(nums)))
+    if len(set(nums)) != len(nums):
+        raise ValueError('Value Error: a card is repeated')
+    return nums
+
+
+def evaluate_chunk(chunk, input_format, fields, id_field=None, header=None):
+    """Parse and evaluate one chunk of (line number, raw record) and return its result dicts in order.
+
+    A raw record is a JSON line, or the list of values of a CSV row with the column names in header.
+    Records that cannot be parsed get an error instead of a combo.
+    """
+    results = []
+    rows = []
+    for line, raw in chunk:
+        result = {'line': line}
+        try:
+            record = json.loads(raw) if input_format == 'jsonl' else dict(zip(header, raw))
+            if id_field is not None and isinstance(record, dict):
+                result['id'] = record.get(id_field)
+            rows.append((result, _record_nums(record, fields)))
+        except (ValueError, TypeError, AttributeError) as error:
+            result['error'] = str(error)
+        results.append(result)
+    if rows:
+        evaluated_rows, scalar_rows = evaluate_rows([nums for result, nums in rows])
+        for (result, nums), evaluated in zip(rows, evaluated_rows):
+            if isinstance(evaluated, Exception):
+                result['error'] = str(evaluated)
+                continue
+            five, strength = evaluated
+            order = strength >> CATEGORY_SHIFT
+            result.update(combo=ComboIdentifier.ALL_COMBOS[order], order=order, strength=strength,
+                          best_five=' '.join(short_card(num) for num in five))
+    return results
+
+
+def _format_of(path, default='jsonl'):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return default
+
+
+def _chunks(file, input_format, chunk_size):
+    # Yield (header, chunk) with chunk a list of (line number, raw record), skipping the blank lines.
+    header = None
+    if input_format == 'csv':
+        reader = csv.reader(file)
+        header = next(reader, None)
+        records = ((reader.line_num, row) for row in reader if row)
+    else:
+        records = ((line, text) for line, text in enumerate(file, 1) if text.strip())
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield header, chunk
+            chunk = []
+    if chunk:
+        yield header, chunk
+
+
+class _Writer:
+    def __init__(self, file, output_format, id_field):
+        self.file = file
+        self.output_format = output_format
+        fields = [field for field in OUTPUT_FIELDS if field != 'id' or id_field is not None]
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(file, fields, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, results):
+        if self.output_format == 'csv':
+            self.writer.writerows(results)
+        else:
+            self.file.write(''.join(json.dumps(result) + '\n' for result in results))
+
+
+def evaluate_file(input_path, output_path, fields=('cards',), id_field=None, input_format=None, output_format=None,
+                  chunk_size=10000, n_workers=None, max_in_flight=None):
+    """Evaluate every record of input_path and stream the results to output_path, in the input order.
+
+    The formats default to the file extensions (.csv, else JSON lines). n_workers=1 evaluates in this process.
+    Return the counts of records and errors and the time taken.
+    """
+    assert chunk_size > 0, 'Value Error: chunk_size must be positive'
+    input_format = input_format or _format_of(input_path)
+    output_format = output_format or _format_of(output_path)
+    assert input_format in ('jsonl', 'csv') and output_format in ('jsonl', 'csv'), \
+        'Value Error: formats must be jsonl or csv'
+    fields = [fields] if isinstance(fields, str) else list(fields)
+    n_workers = n_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * n_workers
+    stats = {'records': 0, 'errors': 0, 'chunks': 0}
+    start = time.perf_counter()
+
+    def flush(results, writer):
+        writer.write(results)
+        stats['records'] += len(results)
+        stats['errors'] += sum(1 for result in results if 'error' in result)
+        stats['chunks'] += 1
+
+    with open(input_path, newline='' if input_format == 'csv' else None) as source, \
+            open(output_path, 'w', newline='' if output_format == 'csv' else None) as target:
+        writer = _Writer(target, output_format, id_field)
+        chunks = _chunks(source, input_format, chunk_size)
+        if n_workers == 1:
+            for header, chunk in chunks:
+                flush(evaluate_chunk(chunk, input_format, fields, id_field, header), writer)
+        else:
+            tasks = ((chunk, input_format, fields, id_field, header) for header, chunk in chunks)
+            for results in pool_map(evaluate_chunk, tasks, n_workers, max_in_flight, ordered=True):
+                flush(results, writer)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate the hands of a JSON lines or CSV hand history.')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--fields', nargs='+', default=['cards'], help='fields holding the cards')
+    parser.add_argument('--id-field', default=None, help='field copied to the results to identify the hands')
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'), default=None)
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'), default=None)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+    stats = evaluate_file(args.input, args.output, args.fields, args.id_field, args.input_format, args.output_format,
+                          args.chunk_size, args.workers)
+    print('{records} records ({errors} errors) in {seconds:.2f}s'.format(**stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Hand ranges in the usual notation and range against range equity.
+
+HandRange.parse reads comma separated tokens into weighted hole card combos:
+    AA, 76s, AKo, AK      one hand class (suited, offsuit, or both)
+    QQ+, KTs+             a pair and every higher pair, or the kicker up to one below the high card
+    22-66, A5s-A2s, 76s-54s  a run of pairs, of kickers, or of hands with the same gap
+    AsKh                  one exact combo
+    AKs:0.5               any token with a weight (1 by default)
+Ranks are 2-9, T (or 10), J, Q, K, A and suits are s (Spades), h (Hearts), c (Clubs) and d (Squares).
+
+range_equity evaluates every live combo of both ranges once per runout, then counts the villain combos
+each hero combo beats or ties with prefix sums over the villain strengths, correcting for the villain
+combos that share a card with the hero combo, instead of comparing every pair of combos.
+"""
+import bisect
+import itertools
+import random
+
+from cards_property import CardSet, card_nums
+from hand_evaluator import HandEvaluator, CARD_WEIGHT, RANK_BIT
+
+RANK_CHARS = '23456789TJQKA'
+SUIT_CHARS = {'d': 0, 'c': 1, 'h': 2, 's': 3}
+
+
+def card_num(rank, suit):
+    # Card number of a rank (2 to 14) and a suit index, with the A first in each suit like Card.
+    return suit * 13 + (rank - 1) % 13
+
+
+def parse_card(text):
+    # Parse a short card string such as 'As', 'Td' or '10h' into a card number.
+    text = text.strip().replace('10', 'T')
+    assert len(text) == 2 and text[0].upper() in RANK_CHARS and text[1].lower() in SUIT_CHARS, \
+        'Value Error: {} is not a card'.format(text)
+    return card_num(RANK_CHARS.index(text[0].upper()) + 2, SUIT_CHARS[text[1].lower()])
+
+
+def _nums_of(cards):
+    # Card numbers of short card strings ('Ks 7h 2d' or ['Ks', '7h', '2d']), or of anything card_nums takes.
+    if isinstance(cards, str):
+        cards = cards.replace(',', ' ').split()
+    if isinstance(cards, (list, tuple)):
+        return [parse_card(card) if isinstance(card, str) else card_nums([card])[0] for card in cards]
+    return card_nums(cards)
+
+
+def class_combos(high, low, kind=''):
+    # The combos of a hand class: a pair when high == low, else kind is 's' (suited), 'o' (offsuit) or '' (both).
+    combos = []
+    for suit_1, suit_2 in itertools.product(range(4), repeat=2):
+        if high == low and suit_1 >= suit_2:
+            continue
+        if high != low and (kind == 's' and suit_1 != suit_2 or kind == 'o' and suit_1 == suit_2):
+            continue
+        combos.append(tuple(sorted((card_num(high, suit_1), card_num(low, suit_2)))))
+    return combos
+
+
+def _parse_class(token):
+    ranks = token[:2].upper()
+    kind = token[2:].lower()
+    assert len(ranks) == 2 and all(rank in RANK_CHARS for rank in ranks) and kind in ('', 's', 'o'), \
+        'Value Error: {} is not a hand class'.format(token)
+    high, low = sorted((RANK_CHARS.index(rank) + 2 for rank in ranks), reverse=True)
+    assert not (high == low and kind), 'Value Error: a pair cannot be suited or offsuit'
+    return high, low, kind
+
+
+def _expand(token):
+    # Return the combos of one token without its weight.
+    token = token.replace('10', 'T')
+    if len(token) == 4 and token[1].lower() in SUIT_CHARS and token[3].lower() in SUIT_CHARS:
+        combo = tuple(sorted((parse_card(token[:2]), parse_card(token[2:]))))
+        assert combo[0] != combo[1], 'Value Error: {} repeats a card'.format(token)
+        return [combo]
+    if token.endswith('+'):
+        high, low, kind = _parse_class(token[:-1])
+        if high == low:
+            classes = [(rank, rank) for rank in range(low, 15)]
+        else:
+            classes = [(high, kicker) for kicker in range(low, high)]
+    elif '-' in token:
+        first, last = (_parse_class(part) for part in token.split('-'))
+        assert first[2] == last[2], 'Value Error: {} mixes suited and offsuit hands'.format(token)
+        kind = first[2]
+        if first[0] == first[1]:
+            assert last[0] == last[1], 'Value Error: {} is not a run of pairs'.format(token)
+            classes = [(rank, rank) for rank in range(min(first[0], last[0]), max(first[0], last[0]) + 1)]
+        elif first[0] == last[0]:
+            classes = [(first[0], kicker) for kicker in range(min(first[1], last[1]), max(first[1], last[1]) + 1)]
+        else:
+            gap = first[0] - first[1]
+            assert last[0] - last[1] == gap, 'Value Error: {} is not a run of hands with the same gap'.format(token)
+            classes = [(high, high - gap) for high in range(min(first[0], last[0]), max(first[0], last[0]) + 1)]
+    else:
+        high, low, kind = _parse_class(token)
+        classes = [(high, low)]
+    combos = []
+    for high, low in classes:
+        combos.extend(class_combos(high, low, kind))
+    return combos
+
+
+class HandRange:
+    def __init__(self, combos=None):
+        # combos maps a sorted pair of card numbers to its weight.
+        self.combos = dict(combos or {})
+
+    @classmethod
+    def parse(cls, text):
+        hand_range = cls()
+        for token in text.split(','):
+            token = token.strip()
+            if not token:
+                continue
+            weight = 1.0
+            if ':' in token:
+                token, weight = token.split(':')
+                weight = float(weight)
+            assert weight >= 0, 'Value Error: weights cannot be negative'
+            for combo in _expand(token.strip()):
+                hand_range.combos[combo] = weight
+        return hand_range
+
+    def without(self, cards):
+        # Return the range without the combos that use any of the cards (board and dead cards).
+        removed = CardSet(_nums_of(cards))
+        return HandRange({combo: weight for combo, weight in self.combos.items()
+                          if combo[0] not in removed and combo[1] not in removed and weight > 0})
+
+    def __len__(self):
+        return len(self.combos)
+
+    def __iter__(self):
+        return iter(self.combos.items())
+
+    def __repr__(self):
+        return 'HandRange({} combos)'.format(len(self.combos))
+
+
+class _Tally:
+    # Weights of strengths sorted in increasing order, with prefix sums for the weight below or equal to a strength.
+    def __init__(self):
+        self.strengths = []
+        self.weights = []
+
+    def finish(self):
+        self.cumulative = [0.0]
+        for weight in self.weights:
+            self.cumulative.append(self.cumulative[-1] + weight)
+
+    def below_and_equal(self, strength):
+        low = bisect.bisect_left(self.strengths, strength)
+        high = bisect.bisect_right(self.strengths, strength, low)
+        return self.cumulative[low], self.cumulative[high] - self.cumulative[low]
+
+
+class RangeEquityResult:
+    def __init__(self, equity, combo_equity, runouts, exact):
+        self.equity = equity
+        self.combo_equity = combo_equity
+        self.runouts = runouts
+        self.exact = exact
+
+    def __repr__(self):
+        return 'RangeEquityResult(equity={:.4f}, runouts={}, exact={})'.format(self.equity, self.runouts, self.exact)
+
+
+def _runouts(remaining, n_missing, n_samples, seed):
+    if n_samples is None:
+        return itertools.combinations(remaining, n_missing)
+    rng = random.Random(seed)
+    return (rng.sample(remaining, n_missing) for sample in range(n_samples))
+
+
+def range_equity(hero_range, villain_range, board=None, dead_cards=None, n_samples=None, seed=None, evaluator=None):
+    """Return the equity of hero_range against villain_range on the board.
+
+    The board and the dead cards are card strings ('Ks 7h 2d' or ['Ks', '7h', '2d']), Cards or card numbers.
+    Every runout of the board is enumerated unless n_samples is given (by default when more than two board
+    cards are missing, with 2000 sampled runouts), in which case n_samples runouts are drawn with the seed.
+    """
+    if isinstance(hero_range, str):
+        hero_range = HandRange.parse(hero_range)
+    if isinstance(villain_range, str):
+        villain_range = HandRange.parse(villain_range)
+    if evaluator is None:
+        evaluator = HandEvaluator()
+    board = _nums_of(board)
+    known = board + _nums_of(dead_cards)
+    hero_range = hero_range.without(known)
+    villain_range = villain_range.without(known)
+    assert len(hero_range) and len(villain_range), 'Value Error: a range has no combo left'
+    n_missing = 5 - len(board)
+    if n_samples is None and n_missing > 2:
+        n_samples = 2000
+    remaining = (CardSet.full() - CardSet(known)).nums()
+
+    combos = set(hero_range.combos) | set(villain_range.combos)
+    lookup = evaluator.lookup
+    wins = {combo: 0.0 for combo in hero_range.combos}
+    totals = {combo: 0.0 for combo in hero_range.combos}
+    n_runouts = 0
+    for runout in _runouts(remaining, n_missing, n_samples, seed):
+        full_board = board + list(runout)
+        on_board = CardSet(full_board)
+        key = sum(CARD_WEIGHT[num] for num in full_board)
+        masks = [0, 0, 0, 0]
+        for num in full_board:
+            masks[num // 13] |= RANK_BIT[num]
+        # Evaluate every live combo once, the hero and the villain share the combos they both hold.
+        strengths = {}
+        for combo in combos:
+            first, second = combo
+            if first in on_board or second in on_board:
+                continue
+            combo_masks = list(masks)
+            combo_masks[first // 13] |= RANK_BIT[first]
+            combo_masks[second // 13] |= RANK_BIT[second]
+            strengths[combo] = lookup(key + CARD_WEIGHT[first] + CARD_WEIGHT[second], combo_masks)
+
+        overall = _Tally()
+        by_card = {}
+        for combo, weight in sorted(villain_range.combos.items(), key=lambda item: strengths.get(item[0], -1)):
+            if combo not in strengths:
+                continue
+            for tally in (overall, by_card.setdefault(combo[0], _Tally()), by_card.setdefault(combo[1], _Tally())):
+                tally.strengths.append(strengths[combo])
+                tally.weights.append(weight)
+        if not overall.strengths:
+            continue
+        for tally in [overall] + list(by_card.values()):
+            tally.finish()
+
+        for combo, weight in hero_range.combos.items():
+            if combo not in strengths:
+                continue
+            strength = strengths[combo]
+            below, equal = overall.below_and_equal(strength)
+            total = overall.cumulative[-1]
+            # Take out the villain combos that share a card with the hero combo, the same combo is taken out twice.
+            for num in combo:
+                tally = by_card.get(num)
+                if tally is not None:
+                    card_below, card_equal = tally.below_and_equal(strength)
+                    below -= card_below
+                    equal -= card_equal
+                    total -= tally.cumulative[-1]
+            same = villain_range.combos.get(combo, 0.0)
+            equal += same
+            total += same
+            wins[combo] += weight * (below + equal / 2)
+            totals[combo] += weight * total
+        n_runouts += 1
+
+    total_weight = sum(totals.values())
+    assert total_weight > 0, 'Value Error: the ranges have no combos that can meet'
+    combo_equity = {combo: wins[combo] / totals[combo] for combo in wins if totals[combo] > 0}
+    return RangeEquityResult(sum(wins.values()) / total_weight, combo_equity, n_runouts, n_samples is None)
+
+
+def testing():
+    # range_equity against a brute force over every runout and every pair of combos that can meet.
+    evaluator = HandEvaluator()
+    spots = [
+        ('AKs, QQ+:0.5, 76s', 'AA, KQ, 77, AsKs, 65s-43s', ['Ks', '7h', '2d', '5s']),
+        ('JJ-99, AQo', 'KK, AJs+, T9s', 'Ah Td 9c'),
+    ]
+    for hero, villain, board in spots:
+        result = range_equity(hero, villain, board, n_samples=None)
+        board = _nums_of(board)
+        hero_range = HandRange.parse(hero).without(board)
+        villain_range = HandRange.parse(villain).without(board)
+        won = total = 0.0
+        for runout in itertools.combinations((CardSet.full() - CardSet(board)).nums(), 5 - len(board)):
+            full_board = board + list(runout)
+            for hero_combo, hero_weight in hero_range:
+                if set(hero_combo) & set(full_board):
+                    continue
+                hero_strength = evaluator.evaluate(list(hero_combo) + full_board)
+                for villain_combo, villain_weight in villain_range:
+                    if set(villain_combo) & set(full_board + list(hero_combo)):
+                        continue
+                    villain_strength = evaluator.evaluate(list(villain_combo) + full_board)
+                    weight = hero_weight * villain_weight
+                    won += weight * (1.0 if hero_strength > villain_strength else
+                                     0.5 if hero_strength == villain_strength else 0.0)
+                    total += weight
+        assert abs(result.equity - won / total) < 1e-9, (hero, villain, result.equity, won / total)
+    print('range_equity agrees with the brute force on {} spots'.format(len(spots)))
+
+
+if __name__ == '__main__':
+    testing()
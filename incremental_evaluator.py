@@ -0,0 +1,103 @@
+"""
+An evaluator that keeps the state of a growing or shrinking set of cards, for live tables and tree
+searches that deal or take back one card at a time.
+
+The state is the rank key and the per-suit rank masks used by HandEvaluator, the number of cards of
+each rank and the rank mask of all the cards, so add, remove and strength are O(1) and the best straight
+is a single STRAIGHT_TABLE lookup. best() only builds the Combo when it is asked for.
+"""
+from cards_property import Card, Cards
+from hand_evaluator import HandEvaluator, CARD_WEIGHT, RANK_BIT, RANK_OF, STRAIGHT_TABLE, CATEGORY_SHIFT
+from texus_combo_identifier import Combo
+
+
+class IncrementalEvaluator:
+    def __init__(self, cards=None, evaluator=None):
+        if evaluator is None:
+            evaluator = HandEvaluator()
+        self.evaluator = evaluator
+        self.key = 0
+        self.suit_masks = [0, 0, 0, 0]
+        self.rank_counts = [0] * 13
+        self.rank_mask = 0
+        self.cards = {}
+        if cards is not None:
+            if isinstance(cards, Cards):
+                cards = cards.cards
+            for card in cards:
+                self.add(card)
+
+    def add(self, card):
+        if not isinstance(card, Card):
+            card = Card(card)
+        num = card.num
+        assert num not in self.cards, 'Value Error: {} is already in the evaluator'.format(card)
+        self.cards[num] = card
+        self.key += CARD_WEIGHT[num]
+        self.suit_masks[num // 13] |= RANK_BIT[num]
+        rank_index = RANK_OF[num] - 2
+        self.rank_counts[rank_index] += 1
+        self.rank_mask |= RANK_BIT[num]
+
+    def remove(self, card):
+        num = card.num if isinstance(card, Card) else card
+        assert num in self.cards, 'Value Error: {} is not in the evaluator'.format(Card(num))
+        del self.cards[num]
+        self.key -= CARD_WEIGHT[num]
+        self.suit_masks[num // 13] &= ~RANK_BIT[num]
+        rank_index = RANK_OF[num] - 2
+        self.rank_counts[rank_index] -= 1
+        if not self.rank_counts[rank_index]:
+            self.rank_mask &= ~RANK_BIT[num]
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __contains__(self, card):
+        return (card.num if isinstance(card, Card) else card) in self.cards
+
+    def strength(self):
+        # Return the strength of the best five cards, see hand_evaluator.
+        return self.evaluator.lookup(self.key, self.suit_masks)
+
+    def order(self):
+        return self.strength() >> CATEGORY_SHIFT
+
+    def straight_top(self):
+        # Return the top rank of the best straight (5 for A2345), 0 if there is none.
+        return STRAIGHT_TABLE[self.rank_mask]
+
+    def best(self):
+        # Return the Combo of the current cards, the same as ComboIdentifier.find_high_combo.
+        assert self.cards, 'Value Error: the evaluator has no cards'
+        strength = self.strength()
+        five = [self.cards[num] for num in self.evaluator.best_five(self.cards, strength)]
+        return Combo(five, strength >> CATEGORY_SHIFT, strength)
+
+
+def testing(number=20000, seed=0):
+    # A random walk of adds and removes between 5 and 7 cards, checked against HandEvaluator.evaluate and
+    # ComboIdentifier.find_high_combo at every step.
+    import random
+    from texus_combo_identifier import ComboIdentifier
+
+    rng = random.Random(seed)
+    identify = ComboIdentifier()
+    nums = rng.sample(range(52), 5)
+    hand = IncrementalEvaluator(nums)
+    for step in range(number):
+        if len(nums) == 7 or len(nums) > 5 and rng.random() < 0.5:
+            num = nums.pop(rng.randrange(len(nums)))
+            hand.remove(num)
+        else:
+            num = rng.choice([num for num in range(52) if num not in nums])
+            nums.append(num)
+            hand.add(num)
+        assert hand.strength() == hand.evaluator.evaluate(nums), (nums, hand.strength())
+        if step % 10 == 0:
+            assert hand.best().strength == identify.find_high_combo(Cards(cardnums=nums)).strength, nums
+    print('{} adds and removes agree with HandEvaluator'.format(number))
+
+
+if __name__ == '__main__':
+    testing()
@@ -0,0 +1,191 @@
+"""
+Opt-in call counts and timings for the methods of ComboIdentifier.
+
+Nothing is measured until a Profiler is enabled: enabling it replaces the methods on the class with
+timing wrappers and disabling it puts the original functions back, so a disabled profiler costs nothing.
+
+    with Profiler() as profiler:
+        identify.find_high_combo(cards)
+    print(profiler.to_json())
+
+For every method the snapshot has the number of calls and the cumulative time, which includes the time
+of the methods it calls (find_high_combo includes its isX checks). The isX checks also count their hits,
+the calls that returned True, and the categories count the Combo orders found by find_high_combo and
+evaluate_high_combo, once per outermost call (find_high_combo delegating to evaluate_high_combo counts
+one combo). Generator methods such as find_all_combos are left alone, their time is spent in the
+caller's loop.
+"""
+import inspect
+import json
+import threading
+import time
+
+from texus_combo_identifier import ComboIdentifier
+
+COMBO_METHODS = ('find_high_combo', 'evaluate_high_combo')
+
+
+def instrumentable_methods(cls=ComboIdentifier):
+    # The public plain methods of the class, in the order they are defined.
+    return [name for name, function in vars(cls).items()
+            if inspect.isfunction(function) and not name.startswith('_') and not inspect.isgeneratorfunction(function)]
+
+
+class Profiler:
+    # Only one profiler can be enabled on a class at a time.
+    _active = {}
+
+    def __init__(self, cls=ComboIdentifier, methods=None):
+        self.cls = cls
+        self.methods = list(methods) if methods is not None else instrumentable_methods(cls)
+        for name in self.methods:
+            assert inspect.isfunction(vars(cls).get(name)), 'Value Error: {} is not a method of {}'.format(name, cls.__name__)
+        self._originals = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.calls = dict.fromkeys(self.methods, 0)
+        self.time_ns = dict.fromkeys(self.methods, 0)
+        self.hits = {name: 0 for name in self.methods if name.startswith('is')}
+        self.categories = dict.fromkeys(ComboIdentifier.ALL_COMBOS, 0)
+        self.elapsed_ns = 0
+        self._started = None
+
+    @property
+    def enabled(self):
+        return bool(self._originals)
+
+    def reset(self):
+        # Zero the counts in place, the wrappers of an enabled profiler keep writing to the same dicts.
+        with self._lock:
+            for counts in (self.calls, self.time_ns, self.hits, self.categories):
+                for name in counts:
+                    counts[name] = 0
+            self.elapsed_ns = 0
+            self._started = time.perf_counter_ns() if self.enabled else None
+
+    def enable(self):
+        if self.enabled:
+            return self
+        assert self.cls not in Profiler._active, 'Value Error: another profiler is enabled on {}'.format(self.cls.__name__)
+        Profiler._active[self.cls] = self
+        for name in self.methods:
+            self._originals[name] = vars(self.cls)[name]
+            setattr(self.cls, name, self._wrap(name, self._originals[name]))
+        self._started = time.perf_counter_ns()
+        return self
+
+    def disable(self):
+        if not self.enabled:
+            return self
+        for name, function in self._originals.items():
+            setattr(self.cls, name, function)
+        self._originals = {}
+        del Profiler._active[self.cls]
+        self.elapsed_ns += time.perf_counter_ns() - self._started
+        self._started = None
+        return self
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.disable()
+
+    def _wrap(self, name, function):
+        clock = time.perf_counter_ns
+        lock = self._lock
+        calls = self.calls
+        time_ns = self.time_ns
+        hits = self.hits if name in self.hits else None
+        categories = self.categories if name in COMBO_METHODS else None
+        local = self._local
+
+        def wrapper(*args, **kwargs):
+            if categories is not None:
+                # find_high_combo delegates to evaluate_high_combo, only the outermost combo call counts its category.
+                depth = getattr(local, 'combo_depth', 0)
+                local.combo_depth = depth + 1
+            start = clock()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                duration = clock() - start
+                if categories is not None:
+                    local.combo_depth = depth
+            with lock:
+                calls[name] += 1
+                time_ns[name] += duration
+                if hits is not None and result:
+                    hits[name] += 1
+                if categories is not None and not depth and result is not None:
+                    categories[result.name] += 1
+            return result
+
+        wrapper.__name__ = function.__name__
+        wrapper.__qualname__ = function.__qualname__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def snapshot(self):
+        # Return the counts so far as a dict of plain values, ready for json.
+        with self._lock:
+            elapsed_ns = self.elapsed_ns
+            if self._started is not None:
+                elapsed_ns += time.perf_counter_ns() - self._started
+            methods = {}
+            for name in self.methods:
+                calls = self.calls[name]
+                if not calls:
+                    continue
+                methods[name] = {
+                    'calls': calls,
+                    'total_ms': self.time_ns[name] / 1e6,
+                    'mean_us': self.time_ns[name] / calls / 1e3,
+                }
+                if name in self.hits:
+                    methods[name]['hits'] = self.hits[name]
+                    methods[name]['hit_rate'] = self.hits[name] / calls
+            found = sum(self.categories.values())
+            categories = {name: {'count': count, 'share': count / found}
+                          for name, count in self.categories.items() if count}
+        return {
+            'enabled': self.enabled,
+            'elapsed_ms': elapsed_ns / 1e6,
+            'methods': methods,
+            'categories': categories,
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def report(self, top=None):
+        # A text table of the methods, from the most time consuming.
+        methods = sorted(self.snapshot()['methods'].items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        lines = ['{:<28} {:>10} {:>12} {:>10} {:>9}'.format('method', 'calls', 'total ms', 'mean us', 'hit rate')]
+        for name, stats in methods[:top]:
+            hit_rate = stats.get('hit_rate')
+            lines.append('{:<28} {:>10} {:>12.2f} {:>10.2f} {:>9}'.format(
+                name, stats['calls'], stats['total_ms'], stats['mean_us'],
+                '' if hit_rate is None else '{:.1%}'.format(hit_rate)))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return 'Profiler({}, enabled={})'.format(self.cls.__name__, self.enabled)
+
+
+def testing(number=2000):
+    import random
+    from cards_property import Cards
+
+    rng = random.Random(0)
+    legacy = ComboIdentifier(evaluator=False)
+    with Profiler() as profiler:
+        for i in range(number):
+            legacy.find_high_combo(Cards(cardnums=rng.sample(range(52), 7)))
+    print(profiler.report())
+    print(json.dumps(profiler.snapshot()['categories'], indent=2))
+
+
+if __name__ == '__main__':
+    testing()
@@ -0,0 +1,206 @@
+"""
+Suit isomorphism: hands and boards that only differ by a relabelling of the suits.
+
+The strength of a hand does not depend on which suit is which, so a hand and a board can be replaced by a
+canonical representative of their class under the 24 permutations of the suits. canonicalize relabels the
+suits in decreasing order of their signature (for each group of cards, the number of cards of the suit then
+its rank mask) and reports the multiplicity of the class, 24 divided by the number of permutations that
+leave the cards unchanged (those that swap suits with equal signatures):
+
+    >>> canonicalize([parse_card('As'), parse_card('Ks')], [parse_card(card) for card in ('Qh', 'Jh', '2h')])
+    ([0, 12], [14, 23, 24], 12)
+
+canonical_boards enumerates the classes of boards directly from the rank masks of the suits, for instance
+the 1755 flops standing for all 22100, with their multiplicities as weights. Given hole cards it deals
+the cards of the hole cards' suits one by one, up to the permutations that keep the hole cards, and takes
+the cards of the other suits from their classes.
+"""
+import itertools
+import math
+
+from cards_property import CardSet, card_nums
+from hand_evaluator import RANK_BIT
+
+_MASKS_BY_SIZE = {}
+
+
+def masks_of_size(n_cards):
+    # All 13-bit rank masks of n_cards ranks from the highest to the lowest, with their rank keys.
+    if n_cards not in _MASKS_BY_SIZE:
+        masks = [mask for mask in range(1 << 13) if bin(mask).count('1') == n_cards]
+        _MASKS_BY_SIZE[n_cards] = [(mask, sum(5 ** bit for bit in range(13) if mask >> bit & 1))
+                                   for mask in reversed(masks)]
+    return _MASKS_BY_SIZE[n_cards]
+
+
+def free_suit_classes(n_free, n_cards, upper=(13, 1 << 13)):
+    # Yield (masks, key, multiplicities) for the ways of dealing n_cards among n_free interchangeable suits,
+    # one per class: the masks are non-increasing in (number of cards, mask) order, key is the sum of
+    # their rank keys and multiplicities counts the equal masks used to weight the class.
+    if n_free == 0:
+        if n_cards == 0:
+            yield (), 0, ()
+        return
+    for size in range(min(n_cards, upper[0]), -1, -1):
+        # The first suit holds at least its share of the cards, or the masks would not be non-increasing.
+        if size * n_free < n_cards:
+            break
+        for mask, key in masks_of_size(size):
+            if (size, mask) > upper:
+                continue
+            for masks, rest_key, counts in free_suit_classes(n_free - 1, n_cards - size, (size, mask)):
+                if masks and masks[0] == mask:
+                    counts = (counts[0] + 1,) + counts[1:]
+                else:
+                    counts = (1,) + counts
+                yield (mask,) + masks, key + rest_key, counts
+
+
+def class_size(n_free, counts):
+    size = math.factorial(n_free)
+    for count in counts:
+        size //= math.factorial(count)
+    return size
+
+
+def _mask_nums(mask, suit):
+    # The card numbers of the ranks in a rank mask, in one suit.
+    return [suit * 13 + (bit + 1) % 13 for bit in range(13) if mask >> bit & 1]
+
+
+def suit_signatures(groups):
+    # The signature of each suit: for every group of card numbers, (number of cards, rank mask) in the suit.
+    signatures = [[] for suit in range(4)]
+    for group in groups:
+        masks = [0, 0, 0, 0]
+        for num in group:
+            masks[num // 13] |= RANK_BIT[num]
+        for suit in range(4):
+            signatures[suit].append((bin(masks[suit]).count('1'), masks[suit]))
+    return [tuple(signature) for signature in signatures]
+
+
+def canonical_suits(groups):
+    """Return (relabel, multiplicity) for groups of card numbers.
+
+    relabel[suit] is the canonical suit of a suit and multiplicity the number of different relabellings
+    of the groups, the size of their class.
+    """
+    signatures = suit_signatures(groups)
+    order = sorted(range(4), key=lambda suit: signatures[suit], reverse=True)
+    relabel = [0] * 4
+    for new_suit, suit in enumerate(order):
+        relabel[suit] = new_suit
+    stabilizer = 1
+    for signature, equal in itertools.groupby(sorted(signatures)):
+        stabilizer *= math.factorial(len(list(equal)))
+    return relabel, 24 // stabilizer
+
+
+def canonicalize_groups(groups):
+    # Return the canonical groups (sorted card numbers) and the multiplicity of their class.
+    groups = [card_nums(group) for group in groups]
+    relabel, multiplicity = canonical_suits(groups)
+    return [sorted(relabel[num // 13] * 13 + num % 13 for num in group) for group in groups], multiplicity
+
+
+def canonicalize(hand, board=None):
+    """Return (hand, board, multiplicity): the canonical card numbers of the hand and of the board, and the
+    number of hand and board pairs in their class. Cards are Cards, Card lists or card numbers."""
+    (hand, board), multiplicity = canonicalize_groups([hand, card_nums(board)])
+    return hand, board, multiplicity
+
+
+def canonical_key(hand, board=None):
+    # A hashable key shared by every hand and board of a class, for caches and dicts.
+    hand, board, multiplicity = canonicalize(hand, board)
+    return tuple(hand), tuple(board)
+
+
+def _hand_stabilizer(hand, used_suits):
+    # The relabellings of the used suits ({suit: new suit}) that leave the hand unchanged.
+    hand = sorted(hand)
+    stabilizer = []
+    for suits in itertools.permutations(used_suits):
+        relabel = dict(zip(used_suits, suits))
+        if sorted(relabel[num // 13] * 13 + num % 13 for num in hand) == hand:
+            stabilizer.append(relabel)
+    return stabilizer
+
+
+def _orbit_size(cards, stabilizer):
+    # The number of images of the sorted cards under the relabellings, 0 when an image is smaller than the
+    # cards: only the smallest image stands for its class, the others are dropped as soon as it shows up.
+    if len(stabilizer) == 1:
+        return 1
+    images = set()
+    for relabel in stabilizer:
+        image = tuple(sorted(relabel[num // 13] * 13 + num % 13 for num in cards))
+        if image < cards:
+            return 0
+        images.add(image)
+    return len(images)
+
+
+def canonical_boards(n_cards, hand=None):
+    """Yield (board, multiplicity) for every class of boards of n_cards cards, boards as sorted card numbers.
+
+    Without a hand the classes come straight from the rank masks of the suits. With hole cards (or any known
+    cards) the boards of the remaining cards are grouped up to the relabellings that keep the hand, the
+    multiplicities then adding up to the number of boards left.
+    """
+    assert 0 <= n_cards <= 5, 'Value Error: a board has 0 to 5 cards'
+    if hand is None:
+        for masks, key, counts in free_suit_classes(4, n_cards):
+            board = sorted(num for suit, mask in enumerate(masks) for num in _mask_nums(mask, suit))
+            yield board, class_size(4, counts)
+        return
+    hand = card_nums(hand)
+    # As in exact_equity, the cards in the suits of the hand are dealt one by one, up to the relabellings of
+    # those suits that keep the hand, and the cards of the free suits come from their classes.
+    used_suits = sorted(set(num // 13 for num in hand))
+    free_suits = [suit for suit in range(4) if suit not in used_suits]
+    remaining = [num for num in (CardSet.full() - CardSet(hand)).nums() if num // 13 in used_suits]
+    stabilizer = _hand_stabilizer(hand, used_suits)
+    for n_used in range(n_cards + 1):
+        free_classes = [(sorted(num for suit, mask in zip(free_suits, masks) for num in _mask_nums(mask, suit)),
+                         class_size(len(free_suits), counts))
+                        for masks, key, counts in free_suit_classes(len(free_suits), n_cards - n_used)]
+        if not free_classes:
+            continue
+        for prefix in itertools.combinations(remaining, n_used):
+            n_images = _orbit_size(prefix, stabilizer)
+            if n_images:
+                for free_board, size in free_classes:
+                    yield sorted(prefix + tuple(free_board)), n_images * size
+
+
+def testing():
+    # canonical_boards against brute force on the flops: every flop canonicalized and counted, then with hole
+    # cards every flop of the remaining cards mapped to its smallest image under the relabellings of the four
+    # suits that keep the hand.
+    import collections
+
+    expected = collections.Counter(tuple(canonicalize_groups([flop])[0][0])
+                                   for flop in itertools.combinations(range(52), 3))
+    found = collections.Counter()
+    for board, multiplicity in canonical_boards(3):
+        found[tuple(canonicalize_groups([board])[0][0])] += multiplicity
+    assert len(expected) == 1755 and found == expected, 'canonical_boards differs from brute force on flops'
+    for hand in ([12, 11], [12, 25], [0, 1], [0, 13]):
+        stabilizer = _hand_stabilizer(hand, range(4))
+
+        def smallest(cards):
+            return min(tuple(sorted(relabel[num // 13] * 13 + num % 13 for num in cards)) for relabel in stabilizer)
+
+        remaining = (CardSet.full() - CardSet(hand)).nums()
+        expected = collections.Counter(smallest(flop) for flop in itertools.combinations(remaining, 3))
+        found = collections.Counter()
+        for board, multiplicity in canonical_boards(3, hand):
+            found[smallest(board)] += multiplicity
+        assert found == expected, 'canonical_boards differs from brute force with the hand {}'.format(hand)
+    print('canonical_boards agrees with brute force on the flops')
+
+
+if __name__ == '__main__':
+    testing()
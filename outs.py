@@ -0,0 +1,168 @@
+"""
+Outs and draws of a hand on a partial board, for the next card only.
+
+find_outs deals every remaining card once onto the hero's IncrementalEvaluator (and the opponent's when
+an opponent hand is given), so each card costs one add, two lookups and one remove instead of a full
+evaluation of every completion. For each card it reports the resulting combo, whether the hero's
+combo order improves and whether the hero then beats or ties the opponent.
+
+The draws are read from the rank and suit masks without dealing any card:
+    flush draw:      a suit with 4 of the hero's cards, one of the hole cards among them, and no flush yet,
+                     backdoor with 3 cards on the flop
+    straight draw:   without a straight, the ranks that would make one, one for a gutshot, two for an
+                     open-ended or a double gutshot draw; with a straight, the ranks that would make a higher
+                     one, a 'higher straight' draw
+"""
+from cards_property import Card, CardSet, card_nums
+from hand_evaluator import HandEvaluator, CATEGORY_SHIFT, STRAIGHT_TABLE, RANK_OF
+from incremental_evaluator import IncrementalEvaluator
+from texus_combo_identifier import ComboIdentifier
+
+
+class NextCard:
+    def __init__(self, num, strength, improves, beats=None, ties=None):
+        self.num = num
+        self.card = Card(num)
+        self.strength = strength
+        self.order = strength >> CATEGORY_SHIFT
+        self.name = ComboIdentifier.ALL_COMBOS[self.order]
+        self.improves = improves
+        # beats and ties are None without an opponent hand.
+        self.beats = beats
+        self.ties = ties
+
+    def __repr__(self):
+        return 'NextCard({}, {}, improves={}, beats={})'.format(self.card, self.name, self.improves, self.beats)
+
+
+class Draws:
+    def __init__(self, flush_suits, backdoor_flush_suits, flush_outs, straight_ranks, straight_outs, straight_draw):
+        self.flush_suits = flush_suits
+        self.backdoor_flush_suits = backdoor_flush_suits
+        self.flush_outs = flush_outs
+        self.straight_ranks = straight_ranks
+        self.straight_outs = straight_outs
+        # None, 'gutshot', 'open-ended', 'double gutshot' or 'higher straight' (with a straight already).
+        self.straight_draw = straight_draw
+
+    def as_dict(self):
+        return {
+            'flush_draws': len(self.flush_suits),
+            'backdoor_flush_draws': len(self.backdoor_flush_suits),
+            'flush_outs': len(self.flush_outs),
+            'straight_draw': self.straight_draw,
+            'straight_outs': len(self.straight_outs),
+        }
+
+    def __repr__(self):
+        return 'Draws({})'.format(self.as_dict())
+
+
+class OutsResult:
+    def __init__(self, strength, next_cards, draws, opponent_strength=None):
+        self.strength = strength
+        self.order = strength >> CATEGORY_SHIFT
+        self.name = ComboIdentifier.ALL_COMBOS[self.order]
+        self.next_cards = next_cards
+        self.draws = draws
+        self.opponent_strength = opponent_strength
+
+    @property
+    def outs(self):
+        # The cards that improve the hero's combo order, or that make the hero win against the opponent.
+        if self.opponent_strength is None:
+            return [next_card for next_card in self.next_cards if next_card.improves]
+        return [next_card for next_card in self.next_cards if next_card.beats]
+
+    def by_category(self):
+        # {combo name: [cards]} of the combos the next card makes.
+        categories = {}
+        for next_card in self.next_cards:
+            categories.setdefault(next_card.name, []).append(next_card.card)
+        return categories
+
+    def __repr__(self):
+        return 'OutsResult({}, outs={}, draws={})'.format(self.name, len(self.outs), self.draws)
+
+
+def find_draws(hole_cards, board, remaining=None, evaluator=None):
+    """Return the Draws of the hole cards on the board, from the rank and suit masks only.
+
+    The outs are counted among the remaining card numbers (all the unseen cards by default).
+    """
+    hole_suits = set(num // 13 for num in card_nums(hole_cards))
+    hand = IncrementalEvaluator(card_nums(hole_cards) + card_nums(board), evaluator)
+    known = CardSet(list(hand.cards))
+    if remaining is None:
+        remaining = (CardSet.full() - known).nums()
+    remaining = CardSet(remaining)
+
+    suit_counts = [bin(mask).count('1') for mask in hand.suit_masks]
+    # A suit the hero holds no card of is the board's draw, not the hero's.
+    flush_suits = [suit for suit in hole_suits if suit_counts[suit] == 4]
+    backdoor_flush_suits = [suit for suit in hole_suits if suit_counts[suit] == 3 and len(hand) == 5]
+    flush_outs = [num for num in remaining.nums() if num // 13 in flush_suits]
+
+    rank_mask = hand.rank_mask
+    top = STRAIGHT_TABLE[rank_mask]
+    # The ranks that make a straight, or a higher one when there is a straight already, with the rank bit at rank - 2.
+    straight_ranks = [rank for rank in range(2, 15) if STRAIGHT_TABLE[rank_mask | 1 << (rank - 2)] > top]
+    straight_outs = [num for num in remaining.nums() if RANK_OF[num] in straight_ranks]
+    straight_draw = None
+    if top and straight_ranks:
+        straight_draw = 'higher straight'
+    elif len(straight_ranks) == 1:
+        straight_draw = 'gutshot'
+    elif len(straight_ranks) > 1:
+        straight_draw = 'double gutshot'
+        for low in range(9):
+            # Four ranks in a row from low + 2, completed by the rank below (the A below 2345) or the rank above.
+            window = 0b1111 << low
+            below = low + 1 if low else 14
+            if rank_mask & window == window and below in straight_ranks and low + 6 in straight_ranks:
+                straight_draw = 'open-ended'
+                break
+    return Draws(flush_suits, backdoor_flush_suits, flush_outs, straight_ranks, straight_outs, straight_draw)
+
+
+def find_outs(hole_cards, board, opponent=None, dead_cards=None, evaluator=None):
+    """Return the OutsResult of the hole cards for every possible next card of the board.
+
+    opponent is the opponent's hole cards, the next cards then say whether the hero beats them. The
+    opponent and dead cards are not dealt.
+    """
+    hole_cards = card_nums(hole_cards)
+    board = card_nums(board)
+    opponent = card_nums(opponent) if opponent is not None else None
+    assert 3 <= len(board) <= 4, 'Value Error: board must have 3 or 4 cards'
+    known = hole_cards + board + (opponent or []) + card_nums(dead_cards)
+    assert len(set(known)) == len(known), 'Value Error: cards are repeated'
+    if evaluator is None:
+        evaluator = HandEvaluator()
+    remaining = (CardSet.full() - CardSet(known)).nums()
+
+    hero = IncrementalEvaluator(hole_cards + board, evaluator)
+    strength = hero.strength()
+    order = strength >> CATEGORY_SHIFT
+    villain = None
+    opponent_strength = None
+    if opponent is not None:
+        villain = IncrementalEvaluator(opponent + board, evaluator)
+        opponent_strength = villain.strength()
+
+    next_cards = []
+    for num in remaining:
+        hero.add(num)
+        next_strength = hero.strength()
+        hero.remove(num)
+        improves = next_strength >> CATEGORY_SHIFT > order
+        if villain is None:
+            next_cards.append(NextCard(num, next_strength, improves))
+            continue
+        villain.add(num)
+        villain_strength = villain.strength()
+        villain.remove(num)
+        next_cards.append(NextCard(num, next_strength, improves, next_strength > villain_strength,
+                                   next_strength == villain_strength))
+    draws = find_draws(hole_cards, board, remaining, evaluator)
+    return OutsResult(strength, next_cards, draws, opponent_strength)
@@ -0,0 +1,314 @@
+"""
+Precomputed preflop all-in equities of the 169 starting hand classes.
+
+The classes are the cells of the usual 13 x 13 grid, A first: the pairs on the diagonal, the suited hands
+above it and the offsuit hands below, so class_index of two hole cards is a couple of lookups.
+
+build_preflop_table computes
+    heads_up[hero, villain]:  equity of a class against another, averaged over all the combo pairs that
+                              do not share a card, exact (n_samples=None) or from n_samples boards
+    multiway[hero, n - 1]:    equity of a class against n random hands, for n up to max_opponents
+The combo pairs of a matchup are grouped up to the relabellings of the suits (see isomorphism), and
+heads_up[villain, hero] is 1 - heads_up[hero, villain], so only the matchups with hero <= villain run.
+
+The job runs on a process pool and appends every finished matchup to a checkpoint file, so an
+interrupted run (or one stopped by max_time) resumes where it stopped. The finished table is written
+with table_store as fixed point uint32 arrays and PreflopTable maps it back for O(1) lookups:
+
+    python preflop_table.py build preflop.bin --samples 20000 --max-opponents 5
+    PreflopTable('preflop.bin').equity('AKs', 'QQ')
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+from cards_property import CardSet, card_nums
+from equity import exact_equity, monte_carlo_equity
+from hand_evaluator import HandEvaluator, CARD_WEIGHT, RANK_BIT, RANK_OF, SUIT_OF
+from hand_range import RANK_CHARS, class_combos
+from isomorphism import canonicalize_groups
+from process_pool import pool_map
+from rng_streams import derive_seed
+from table_store import write_tables, load_tables
+
+N_CLASSES = 169
+# Equities are stored as integers, in units of 1 / EQUITY_SCALE.
+EQUITY_SCALE = 10 ** 9
+# The kind and version of the table file, bumped when the layout or the scale changes.
+TABLE_KIND = 'preflop'
+TABLE_VERSION = 1
+
+
+def class_index(hole_cards):
+    # The grid index of two hole cards: row and column are 14 - rank, suited above the diagonal.
+    first, second = card_nums(hole_cards)
+    high, low = sorted((RANK_OF[first], RANK_OF[second]), reverse=True)
+    if SUIT_OF[first] == SUIT_OF[second]:
+        return (14 - high) * 13 + 14 - low
+    return (14 - low) * 13 + 14 - high
+
+
+def class_name(index):
+    row, column = divmod(index, 13)
+    if row == column:
+        return RANK_CHARS[12 - row] * 2
+    if row < column:
+        return RANK_CHARS[12 - row] + RANK_CHARS[12 - column] + 's'
+    return RANK_CHARS[12 - column] + RANK_CHARS[12 - row] + 'o'
+
+
+CLASS_NAMES = [class_name(index) for index in range(N_CLASSES)]
+CLASS_INDEX = {name: index for index, name in enumerate(CLASS_NAMES)}
+
+
+def class_of(hand):
+    # The index of a class name ('AKs', 'QQ') or of two hole cards.
+    if isinstance(hand, str):
+        assert hand in CLASS_INDEX, 'Value Error: {} is not a hand class'.format(hand)
+        return CLASS_INDEX[hand]
+    return class_index(hand)
+
+
+def index_combos(index):
+    # All the combos (sorted pairs of card numbers) of a class.
+    row, column = divmod(index, 13)
+    if row == column:
+        return class_combos(14 - row, 14 - row)
+    if row < column:
+        return class_combos(14 - row, 14 - column, 's')
+    return class_combos(14 - column, 14 - row, 'o')
+
+
+def matchup_classes(hero, villain):
+    # Return [(hero combo, villain combo, count)], one per class of combo pairs up to the suits.
+    classes = collections.OrderedDict()
+    for hero_combo in index_combos(hero):
+        for villain_combo in index_combos(villain):
+            if set(hero_combo) & set(villain_combo):
+                continue
+            key = tuple(tuple(group) for group in canonicalize_groups([hero_combo, villain_combo])[0])
+            if key in classes:
+                classes[key][2] += 1
+            else:
+                classes[key] = [list(hero_combo), list(villain_combo), 1]
+    return list(classes.values())
+
+
+def _sampled_share(evaluator, hero_combo, villain_combo, n_samples, rng):
+    # The hero's share of the pot over n_samples random boards.
+    remaining = (CardSet.full() - CardSet(hero_combo + villain_combo)).nums()
+    lookup = evaluator.lookup
+    bases = []
+    for combo in (hero_combo, villain_combo):
+        masks = [0, 0, 0, 0]
+        for num in combo:
+            masks[num // 13] |= RANK_BIT[num]
+        bases.append((CARD_WEIGHT[combo[0]] + CARD_WEIGHT[combo[1]], masks))
+    share = 0.0
+    for sample in range(n_samples):
+        board = rng.sample(remaining, 5)
+        board_key = 0
+        board_masks = [0, 0, 0, 0]
+        for num in board:
+            board_key += CARD_WEIGHT[num]
+            board_masks[num // 13] |= RANK_BIT[num]
+        hero_strength, villain_strength = [
+            lookup(key + board_key, [mask | board_mask for mask, board_mask in zip(masks, board_masks)])
+            for key, masks in bases]
+        if hero_strength > villain_strength:
+            share += 1.0
+        elif hero_strength == villain_strength:
+            share += 0.5
+    return share / n_samples
+
+
+def heads_up_equity(hero, villain, n_samples=None, seed=0, evaluator=None):
+    """Return the equity of class hero against class villain (indexes), exact when n_samples is None.
+
+    The n_samples boards are shared among the classes of combo pairs in proportion to their counts.
+    """
+    if evaluator is None:
+        evaluator = HandEvaluator()
+    classes = matchup_classes(hero, villain)
+    total = sum(count for hero_combo, villain_combo, count in classes)
+    equity = 0.0
+    for position, (hero_combo, villain_combo, count) in enumerate(classes):
+        if n_samples is None:
+            share = exact_equity([hero_combo, villain_combo])[0].equity
+        else:
+            rng = random.Random(derive_seed(seed, 'heads_up', hero, villain, position))
+            share = _sampled_share(evaluator, hero_combo, villain_combo,
+                                   max(1, round(n_samples * count / total)), rng)
+        equity += share * count
+    return equity / total
+
+
+def multiway_equity(hero, n_opponents, n_samples=100000, seed=0):
+    # Every combo of a class has the same equity against random hands, so one stands for the class.
+    hero_combo = index_combos(hero)[0]
+    return monte_carlo_equity(list(hero_combo), n_opponents=n_opponents, n_samples=n_samples,
+                              seed=derive_seed(seed, 'multiway', hero, n_opponents), n_workers=1).equity
+
+
+def _run_unit(unit, n_samples, multiway_samples, seed):
+    if unit[0] == 'heads_up':
+        return unit, heads_up_equity(unit[1], unit[2], n_samples, seed)
+    return unit, multiway_equity(unit[1], unit[2], multiway_samples, seed)
+
+
+def _units(max_opponents):
+    units = [('heads_up', hero, villain) for hero in range(N_CLASSES) for villain in range(hero, N_CLASSES)]
+    units += [('multiway', hero, n_opponents) for n_opponents in range(2, max_opponents + 1)
+              for hero in range(N_CLASSES)]
+    return units
+
+
+def _read_checkpoint(path, settings):
+    # Return {unit: equity} of the finished units, the settings must match the ones the file was started with.
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as file:
+        lines = file.read().splitlines()
+    if not lines:
+        # Stopped before the settings were written, a new checkpoint.
+        return done
+    assert json.loads(lines[0]).get('settings') == settings, \
+        'Value Error: {} was written with other settings'.format(path)
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A line cut by an interruption, its unit runs again.
+            continue
+        done[tuple(entry['unit'])] = entry['equity']
+    return done
+
+
+def build_preflop_table(path, n_samples=20000, max_opponents=1, multiway_samples=100000, seed=0, n_workers=None,
+                        checkpoint=None, max_time=None):
+    """Compute the heads-up and multiway tables and write them to path, resuming from the checkpoint file.
+
+    n_samples=None computes the heads-up equities exactly, which takes far longer. Return True when the
+    table was written, False when max_time ran out first (run again to resume).
+    """
+    assert max_opponents >= 1, 'Value Error: max_opponents must be at least 1'
+    checkpoint = checkpoint or path + '.checkpoint'
+    settings = {'n_samples': n_samples, 'max_opponents': max_opponents, 'multiway_samples': multiway_samples,
+                'seed': seed}
+    done = _read_checkpoint(checkpoint, settings)
+    todo = [unit for unit in _units(max_opponents) if unit not in done]
+    n_workers = n_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    with open(checkpoint, 'a') as file:
+        if file.tell() == 0:
+            file.write(json.dumps({'settings': settings}) + '\n')
+            file.flush()
+
+        def record(unit, equity):
+            done[unit] = equity
+            file.write(json.dumps({'unit': list(unit), 'equity': equity}) + '\n')
+            file.flush()
+
+        def out_of_time():
+            return max_time is not None and time.perf_counter() - start > max_time
+
+        if n_workers == 1:
+            for unit in todo:
+                if out_of_time():
+                    break
+                record(*_run_unit(unit, n_samples, multiway_samples, seed))
+        else:
+            # No new unit starts once the time is out, the running ones are still recorded.
+            tasks = ((unit, n_samples, multiway_samples, seed)
+                     for unit in itertools.takewhile(lambda unit: not out_of_time(), todo))
+            for unit, equity in pool_map(_run_unit, tasks, n_workers):
+                record(unit, equity)
+
+    if len(done) < len(_units(max_opponents)):
+        return False
+    heads_up = [0] * (N_CLASSES * N_CLASSES)
+    for hero, villain in itertools.combinations_with_replacement(range(N_CLASSES), 2):
+        equity = done[('heads_up', hero, villain)]
+        heads_up[hero * N_CLASSES + villain] = round(equity * EQUITY_SCALE)
+        if villain != hero:
+            heads_up[villain * N_CLASSES + hero] = round((1 - equity) * EQUITY_SCALE)
+    multiway = [0] * (N_CLASSES * max_opponents)
+    for hero in range(N_CLASSES):
+        hero_combo = set(index_combos(hero)[0])
+        for n_opponents in range(1, max_opponents + 1):
+            if n_opponents == 1:
+                # Against one random hand: the heads-up equities weighted by the combos of each villain class
+                # that one hero combo leaves, the same for every hero combo of the class.
+                weights = [sum(1 for combo in index_combos(villain) if not hero_combo & set(combo))
+                           for villain in range(N_CLASSES)]
+                equity = sum(heads_up[hero * N_CLASSES + villain] * weights[villain]
+                             for villain in range(N_CLASSES)) / sum(weights) / EQUITY_SCALE
+            else:
+                equity = done[('multiway', hero, n_opponents)]
+            multiway[hero * max_opponents + n_opponents - 1] = round(equity * EQUITY_SCALE)
+    write_tables(path, {'heads_up': heads_up, 'multiway': multiway}, kind=TABLE_KIND, version=TABLE_VERSION)
+    return True
+
+
+class PreflopTable:
+    # The tables written by build_preflop_table, memory-mapped. Hands are class names or two hole cards.
+    def __init__(self, path):
+        # The file has its own kind and version, it does not go stale when the evaluator tables change.
+        tables = load_tables(path, build=False, kind=TABLE_KIND, version=TABLE_VERSION)
+        assert 'heads_up' in tables and 'multiway' in tables, 'Value Error: {} is not a preflop table'.format(path)
+        self.heads_up = tables['heads_up']
+        self.multiway = tables['multiway']
+        self.max_opponents = len(self.multiway) // N_CLASSES
+
+    def equity(self, hero, villain):
+        return self.heads_up[class_of(hero) * N_CLASSES + class_of(villain)] / EQUITY_SCALE
+
+    def equity_vs_random(self, hero, n_opponents=1):
+        assert 1 <= n_opponents <= self.max_opponents, \
+            'Value Error: the table goes up to {} opponents'.format(self.max_opponents)
+        return self.multiway[class_of(hero) * self.max_opponents + n_opponents - 1] / EQUITY_SCALE
+
+    def __repr__(self):
+        return 'PreflopTable(max_opponents={})'.format(self.max_opponents)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the preflop equity table.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build')
+    build.add_argument('path')
+    build.add_argument('--samples', type=int, default=20000, help='boards per heads-up matchup, 0 for exact')
+    build.add_argument('--max-opponents', type=int, default=1)
+    build.add_argument('--multiway-samples', type=int, default=100000)
+    build.add_argument('--seed', type=int, default=0)
+    build.add_argument('--workers', type=int, default=None)
+    build.add_argument('--max-time', type=float, default=None, help='seconds before stopping, resume later')
+    query = subparsers.add_parser('query')
+    query.add_argument('path')
+    query.add_argument('hero')
+    query.add_argument('villain', nargs='?', help='a class, else the equity against random hands')
+    query.add_argument('--opponents', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        finished = build_preflop_table(args.path, args.samples or None, args.max_opponents, args.multiway_samples,
+                                       args.seed, args.workers, max_time=args.max_time)
+        print('wrote {}'.format(args.path) if finished else 'stopped, run again to resume')
+        return 0 if finished else 1
+    table = PreflopTable(args.path)
+    if args.villain:
+        print('{:.4f}'.format(table.equity(args.hero, args.villain)))
+    else:
+        print('{:.4f}'.format(table.equity_vs_random(args.hero, args.opponents)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Bounded parallel map over a process pool, used by equity, hand_history and preflop_table.
+
+pool_map keeps at most max_in_flight tasks in the pool and only takes the next arguments once a task is
+done, so the arguments can be a lazy iterator (chunks of a file, units until a deadline) and memory stays
+bounded whatever their number. Leaving the loop over the results cancels the tasks not started yet, so
+stopping early wastes little work.
+
+    for counts in pool_map(run_chunk, chunks, n_workers):
+        ...
+"""
+import collections
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from hand_evaluator import HandEvaluator
+
+
+def pool_map(function, arguments, n_workers, max_in_flight=None, ordered=False):
+    """Yield function(*args) for every tuple args of arguments, run on n_workers processes.
+
+    ordered=True yields the results in the order of the arguments, else as soon as they are done.
+    max_in_flight defaults to 2 * n_workers.
+    """
+    max_in_flight = max_in_flight or 2 * n_workers
+    arguments = iter(arguments)
+    # Build the lookup tables before forking so that the workers inherit them.
+    HandEvaluator()
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        pending = collections.deque()
+        try:
+            while True:
+                while len(pending) < max_in_flight:
+                    args = next(arguments, None)
+                    if args is None:
+                        break
+                    pending.append(pool.submit(function, *args))
+                if not pending:
+                    return
+                if ordered:
+                    # The oldest task first, so at most max_in_flight results wait in memory.
+                    yield pending.popleft().result()
+                    continue
+                finished, running = wait(pending, return_when=FIRST_COMPLETED)
+                pending = collections.deque(future for future in pending if future in running)
+                for future in finished:
+                    yield future.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
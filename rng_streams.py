@@ -0,0 +1,98 @@
+"""
+Reproducible, independent random streams for parallel simulations.
+
+RandomStreams derives the seed of every stream from a root seed and the stream's path (for example
+(worker, chunk)) with SHA-256, so any stream can be recreated on its own in any process, whatever the
+number of workers or the order they run in. Streams are random.Random objects, accepted by Deck,
+Deck.shuffle and Dealer, or numpy Generators for the vectorized batch_shuffles and batch_deals.
+"""
+import hashlib
+import operator
+import random
+
+from cards_property import CardSet, card_nums
+
+
+def _plain(value):
+    # numpy integers hash as the int they stand for, so np.int64(3) and 3 give the same stream.
+    try:
+        return operator.index(value)
+    except TypeError:
+        return value
+
+
+def derive_seed(seed, *path):
+    # A 128-bit seed that only depends on the root seed and the path.
+    key = tuple(_plain(value) for value in (seed,) + path)
+    digest = hashlib.sha256(repr(key).encode()).digest()
+    return int.from_bytes(digest[:16], 'big')
+
+
+class RandomStreams:
+    def __init__(self, seed=None, path=()):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        self.path = tuple(path)
+
+    def seed_of(self, index):
+        return derive_seed(self.seed, *(self.path + (index,)))
+
+    def stream(self, index):
+        # The random.Random of one worker, thread or chunk.
+        return random.Random(self.seed_of(index))
+
+    def spawn(self, n_streams, start=0):
+        return [self.stream(index) for index in range(start, start + n_streams)]
+
+    def child(self, index):
+        # The streams under one index, for instance the chunks of one worker.
+        return RandomStreams(self.seed, self.path + (index,))
+
+    def numpy_generator(self, index):
+        import numpy as np
+        return np.random.default_rng(self.seed_of(index))
+
+    def __repr__(self):
+        return 'RandomStreams(seed={}, path={})'.format(self.seed, self.path)
+
+
+def batch_shuffles(generator, n_shuffles, dead_cards=None):
+    """Return an (n_shuffles, n_cards) numpy array, each row a random order of the cards left after the dead cards.
+
+    generator is a numpy Generator, for instance RandomStreams.numpy_generator(index).
+    """
+    import numpy as np
+    nums = np.array((CardSet.full() - CardSet(card_nums(dead_cards))).nums(), dtype=np.int8)
+    order = np.argsort(generator.random((n_shuffles, len(nums))), axis=1)
+    return nums[order]
+
+
+def batch_deals(generator, n_deals, n_cards, dead_cards=None):
+    """Return an (n_deals, n_cards) numpy array of n_cards random cards per row, without the dead cards.
+
+    Only the dealt cards are ordered: the n_cards smallest of one random key per card are picked, then sorted.
+    """
+    import numpy as np
+    nums = np.array((CardSet.full() - CardSet(card_nums(dead_cards))).nums(), dtype=np.int8)
+    assert 0 < n_cards <= len(nums), 'Value Error: number of cards drawn fewer than cards in deck'
+    keys = generator.random((n_deals, len(nums)))
+    picked = np.argpartition(keys, n_cards - 1, axis=1)[:, :n_cards]
+    order = np.argsort(np.take_along_axis(keys, picked, axis=1), axis=1)
+    return nums[np.take_along_axis(picked, order, axis=1)]
+
+
+def testing():
+    # The same seeds whatever the integer type, and a stream recreated on its own matches the spawned one.
+    import numpy as np
+
+    assert derive_seed(np.int64(3), 0) == derive_seed(3, 0) == derive_seed(3, np.int32(0))
+    assert derive_seed(3, 0) != derive_seed(3, 1) != derive_seed(4, 1)
+    streams = RandomStreams(np.uint64(7), (np.int64(1),))
+    assert streams.seed_of(2) == RandomStreams(7).child(1).seed_of(2)
+    assert streams.spawn(3)[2].random() == RandomStreams(7, (1,)).stream(2).random()
+    print('seeds agree across integer types')
+
+
+if __name__ == '__main__':
+    testing()
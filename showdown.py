@@ -0,0 +1,189 @@
+"""
+Resolve a showdown: rank the players' hands on a board and split the main pot and the side pots.
+
+All the hands of a showdown are evaluated in one pass to integer strengths (see hand_evaluator), so
+ranking the players and finding the winners of each pot are integer comparisons. resolve_showdowns
+evaluates the hands of many showdowns in a single numpy batch when numpy is installed.
+
+Pots are built from each player's total contribution: every distinct contribution level of the players
+still in the hand closes a pot that only the players who put in at least that much can win. Chips that
+do not split evenly go one by one to the winners in seat order.
+"""
+from cards_property import Card, card_nums
+from hand_evaluator import HandEvaluator, CATEGORY_SHIFT
+from texus_combo_identifier import Combo
+
+
+class Pot:
+    def __init__(self, amount, eligible):
+        self.amount = amount
+        self.eligible = eligible
+        self.winners = []
+        self.shares = {}
+
+    def __repr__(self):
+        return 'Pot(amount={}, eligible={}, winners={})'.format(self.amount, self.eligible, self.winners)
+
+
+class ShowdownResult:
+    def __init__(self, hands, board, strengths, folded, pots, evaluator):
+        # strengths[player] is None for the players who folded.
+        self.hands = hands
+        self.board = board
+        self.strengths = strengths
+        self.folded = folded
+        self.pots = pots
+        self._evaluator = evaluator
+        live = sorted((player for player, strength in enumerate(strengths) if strength is not None),
+                      key=lambda player: strengths[player], reverse=True)
+        # ranking groups the players with equal hands, from the best hand to the worst.
+        self.ranking = []
+        for player in live:
+            if self.ranking and strengths[self.ranking[-1][0]] == strengths[player]:
+                self.ranking[-1].append(player)
+            else:
+                self.ranking.append([player])
+        self.payouts = [0] * len(hands)
+        for pot in pots:
+            for player, share in pot.shares.items():
+                self.payouts[player] += share
+
+    @property
+    def winners(self):
+        return self.ranking[0] if self.ranking else []
+
+    def combo(self, player):
+        # Build the Combo of a player, only when it is asked for.
+        strength = self.strengths[player]
+        if strength is None:
+            return None
+        nums = self.hands[player] + self.board
+        five = self._evaluator.best_five(nums, strength)
+        return Combo([Card(num) for num in five], strength >> CATEGORY_SHIFT, strength)
+
+    def __repr__(self):
+        return 'ShowdownResult(ranking={}, payouts={})'.format(self.ranking, self.payouts)
+
+
+def build_pots(contributions, folded):
+    # Split the contributions into the main pot and the side pots, each with the players who can win it.
+    levels = sorted(set(amount for player, amount in enumerate(contributions) if amount > 0 and not folded[player]))
+    pots = []
+    previous = 0
+    for level in levels:
+        amount = sum(min(contribution, level) - min(contribution, previous) for contribution in contributions)
+        eligible = [player for player, contribution in enumerate(contributions)
+                    if contribution >= level and not folded[player]]
+        pots.append(Pot(amount, eligible))
+        previous = level
+    # Folded chips above the highest live contribution go to the last pot, or to a pot of every live player
+    # when no live player put anything in, so that the pots always add up to the contributions.
+    excess = sum(max(contribution - previous, 0) for contribution in contributions)
+    if excess and pots:
+        pots[-1].amount += excess
+    elif excess:
+        pots.append(Pot(excess, [player for player in range(len(contributions)) if not folded[player]]))
+    return pots
+
+
+def award_pots(pots, strengths):
+    for pot in pots:
+        best = max(strengths[player] for player in pot.eligible)
+        pot.winners = [player for player in pot.eligible if strengths[player] == best]
+        share, odd_chips = divmod(pot.amount, len(pot.winners))
+        for index, player in enumerate(pot.winners):
+            pot.shares[player] = share + (1 if index < odd_chips else 0)
+    return pots
+
+
+def _prepare(hands, board, contributions=None, folded=None):
+    hands = [card_nums(hand) for hand in hands]
+    board = card_nums(board)
+    assert len(hands) >= 2, 'Value Error: a showdown needs at least 2 hands'
+    if folded is None:
+        folded = [False] * len(hands)
+    if contributions is None:
+        contributions = [0] * len(hands)
+    assert len(folded) == len(hands) and len(contributions) == len(hands), \
+        'Value Error: contributions and folded must have one entry per hand'
+    assert not all(folded), 'Value Error: every player folded'
+    return hands, board, list(contributions), list(folded)
+
+
+def _finish(hands, board, contributions, folded, strengths, evaluator):
+    strengths = [None if folded[player] else strength for player, strength in enumerate(strengths)]
+    pots = award_pots(build_pots(contributions, folded), strengths)
+    return ShowdownResult(hands, board, strengths, folded, pots, evaluator)
+
+
+def resolve_showdown(hands, board, contributions=None, folded=None, evaluator=None):
+    """Rank the hands on the board and split the pots.
+
+    contributions[player] is the total a player put in the pot (all zero to only rank the hands) and
+    folded[player] marks the players whose chips stay in the pots but who cannot win them.
+    """
+    if evaluator is None:
+        evaluator = HandEvaluator()
+    hands, board, contributions, folded = _prepare(hands, board, contributions, folded)
+    evaluate = evaluator.evaluate
+    strengths = [None if folded[player] else evaluate(hand + board) for player, hand in enumerate(hands)]
+    return _finish(hands, board, contributions, folded, strengths, evaluator)
+
+
+def resolve_showdowns(showdowns, evaluator=None):
+    """Resolve many showdowns given as (hands, board, contributions, folded) tuples (the last two optional).
+
+    The hands of all the showdowns are evaluated together, in one numpy batch when numpy is available and
+    the boards are complete.
+    """
+    if evaluator is None:
+        evaluator = HandEvaluator()
+    prepared = [_prepare(*showdown) for showdown in showdowns]
+    rows = [hand + board for hands, board, contributions, folded in prepared for hand in hands]
+    try:
+        from batch_evaluator import evaluate_batch
+    except ImportError:
+        evaluate_batch = None
+    if evaluate_batch is not None and rows and all(len(row) == 7 for row in rows):
+        strengths = evaluate_batch(rows)[1].tolist()
+    else:
+        strengths = [evaluator.evaluate(row) for row in rows]
+    results = []
+    start = 0
+    for hands, board, contributions, folded in prepared:
+        results.append(_finish(hands, board, contributions, folded, strengths[start:start + len(hands)], evaluator))
+        start += len(hands)
+    return results
+
+
+def testing(number=2000, seed=0):
+    # Random showdowns with side pots: the payouts add up to the contributions, folded players get nothing,
+    # and the batch path agrees with resolve_showdown.
+    import random
+
+    rng = random.Random(seed)
+    evaluator = HandEvaluator()
+    # Two live players who put nothing in and a folded player's 30 chips: the live players split them.
+    result = resolve_showdown([[0, 1], [13, 14], [30, 31]], [26, 27, 40, 41, 5], [0, 0, 30],
+                              [False, False, True], evaluator)
+    assert sum(result.payouts) == 30 and result.payouts[2] == 0, result
+    showdowns = []
+    for index in range(number):
+        n_players = rng.randint(2, 6)
+        nums = rng.sample(range(52), 2 * n_players + 5)
+        hands = [nums[2 * player:2 * player + 2] for player in range(n_players)]
+        contributions = [rng.choice((0, 10, 25, 40, 100)) for player in hands]
+        folded = [rng.random() < 0.3 for player in hands]
+        folded[rng.randrange(n_players)] = False
+        showdowns.append((hands, nums[-5:], contributions, folded))
+    results = resolve_showdowns(showdowns, evaluator)
+    for (hands, board, contributions, folded), result in zip(showdowns, results):
+        assert sum(result.payouts) == sum(contributions), (contributions, folded, result)
+        assert all(result.payouts[player] == 0 for player in range(len(hands)) if folded[player]), result
+        single = resolve_showdown(hands, board, contributions, folded, evaluator)
+        assert single.payouts == result.payouts and single.ranking == result.ranking
+    print('{} showdowns conserve the chips'.format(number))
+
+
+if __name__ == '__main__':
+    testing()
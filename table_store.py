@@ -0,0 +1,386 @@
+"""
+Versioned, checksummed table files for hand_evaluator, memory-mapped at load time.
+
+A table file holds the lookup tables as raw little-endian uint32 arrays behind a small JSON header:
+
+    magic (8 bytes) | header length (uint32) | JSON header | padding | arrays, each 64-byte aligned
+
+The header records the format version, the evaluator version (CATEGORY_SHIFT and TABLES_VERSION), the
+offset and length of every array and the SHA-256 of the array data. load_tables maps the file read-only
+with mmap and returns memoryviews into it (numpy arrays on the same mapping with numpy=True), so the pages are shared
+by every process that maps the same file and by the workers forked after loading. HandEvaluator (through
+get_rank_table and get_flush_table) and batch_evaluator read the mapped arrays directly, nothing is copied
+into the processes.
+
+The rank table is stored as a perfect hash of its keys (hash and displace): a key picks a bucket, the
+displacement of the bucket picks the key's slot, and the slot holds the key, to check it, and its strength.
+MappedRankTable looks keys up in the mapped arrays with a couple of integer operations, a little slower
+than the private dict built in memory when there is no table file.
+
+Build the file once before starting the workers:
+
+    python table_store.py build            # writes TABLE_PATH ($TEXUS_TABLES or hand_tables.bin)
+    python table_store.py info
+
+A missing or stale file is rebuilt on the first load_tables(build=True), and an array missing from the
+file is built in memory the first time it is asked for.
+"""
+import argparse
+import array
+import hashlib
+import json
+import mmap
+import os
+import sys
+import tempfile
+
+import hand_evaluator
+from hand_evaluator import CATEGORY_SHIFT, STRAIGHT_TABLE, HIGH_TABLE, FLUSH_TABLE
+
+MAGIC = b'TEXUSTBL'
+FORMAT_VERSION = 1
+# The kind of the evaluator table files, the other files written with write_tables name their own.
+EVALUATOR = 'evaluator'
+# Bump when the strengths or the layout of a table change, stored files are then rebuilt.
+TABLES_VERSION = 2
+ALIGNMENT = 64
+TABLE_PATH = os.environ.get('TEXUS_TABLES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hand_tables.bin'))
+
+
+# The perfect hash of the rank keys: bucket = key * BUCKET_MULTIPLIER % buckets,
+# slot = (key ^ displacement of the bucket) * SLOT_MULTIPLIER % slots.
+BUCKET_MULTIPLIER = 2246822519
+SLOT_MULTIPLIER = 2654435761
+EMPTY_SLOT = 0xFFFFFFFF
+RANK_HASH_NAMES = ('rank_displacements', 'rank_slot_keys', 'rank_slot_strengths')
+_RANK_HASH = None
+
+
+def build_rank_hash(table, load=0.8, keys_per_bucket=4):
+    # Return (displacements, slot keys, slot strengths) of the rank table dict, the largest buckets placed first.
+    n_slots = int(len(table) / load) + 1
+    n_buckets = len(table) // keys_per_bucket + 1
+    buckets = [[] for bucket in range(n_buckets)]
+    for key in table:
+        buckets[key * BUCKET_MULTIPLIER % n_buckets].append(key)
+    displacements = [0] * n_buckets
+    slot_keys = [EMPTY_SLOT] * n_slots
+    slot_strengths = [0] * n_slots
+    for bucket in sorted(range(n_buckets), key=lambda bucket: len(buckets[bucket]), reverse=True):
+        keys = buckets[bucket]
+        if not keys:
+            break
+        displacement = 0
+        while True:
+            slots = [(key ^ displacement) * SLOT_MULTIPLIER % n_slots for key in keys]
+            if len(set(slots)) == len(slots) and all(slot_keys[slot] == EMPTY_SLOT for slot in slots):
+                break
+            displacement += 1
+        displacements[bucket] = displacement
+        for key, slot in zip(keys, slots):
+            slot_keys[slot] = key
+            slot_strengths[slot] = table[key]
+    return displacements, slot_keys, slot_strengths
+
+
+def _rank_hash():
+    global _RANK_HASH
+    if _RANK_HASH is None:
+        _RANK_HASH = build_rank_hash(hand_evaluator._build_rank_table(STRAIGHT_TABLE))
+    return _RANK_HASH
+
+
+# Every stored table, built from the code of hand_evaluator.
+BUILDERS = {
+    'straight': lambda: STRAIGHT_TABLE,
+    'high': lambda: HIGH_TABLE,
+    'flush': lambda: FLUSH_TABLE,
+    'rank_displacements': lambda: _rank_hash()[0],
+    'rank_slot_keys': lambda: _rank_hash()[1],
+    'rank_slot_strengths': lambda: _rank_hash()[2],
+}
+
+
+class MappedRankTable:
+    # The rank table read from the perfect hash arrays, used like the rank table dict (get, [], in).
+    # Keys that are not in the table (more than 7 cards) are kept in a small private dict.
+    def __init__(self, displacements, slot_keys, slot_strengths):
+        self.displacements = displacements
+        self.slot_keys = slot_keys
+        self.slot_strengths = slot_strengths
+        self._n_buckets = len(displacements)
+        self._n_slots = len(slot_keys)
+        self._extra = {}
+
+    def get(self, key, default=None):
+        slot = (key ^ self.displacements[key * BUCKET_MULTIPLIER % self._n_buckets]) * SLOT_MULTIPLIER % self._n_slots
+        if self.slot_keys[slot] == key:
+            return self.slot_strengths[slot]
+        return self._extra.get(key, default)
+
+    def __getitem__(self, key):
+        strength = self.get(key)
+        if strength is None:
+            raise KeyError(key)
+        return strength
+
+    def __setitem__(self, key, strength):
+        self._extra[key] = strength
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def as_dict(self):
+        # A private dict of the table, the fastest lookups at the cost of a copy per process.
+        table = {key: strength for key, strength in zip(self.slot_keys, self.slot_strengths) if key != EMPTY_SLOT}
+        table.update(self._extra)
+        return table
+
+    def __repr__(self):
+        return 'MappedRankTable({} slots)'.format(self._n_slots)
+
+
+def _uint32(values):
+    values = array.array('I', values)
+    assert values.itemsize == 4, 'Value Error: the platform has no 4 byte unsigned int array'
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def build_tables(names=None):
+    # Return {name: list of ints} for the names, all the tables by default. The rank table is built once.
+    names = list(BUILDERS) if names is None else list(names)
+    return {name: list(BUILDERS[name]()) for name in names}
+
+
+def _expected_version(kind=EVALUATOR, version=None):
+    # The header fields a file must match. The evaluator tables depend on the evaluator, the files of the
+    # other kinds (the preflop table) only on their own version.
+    if kind == EVALUATOR:
+        return {'format': FORMAT_VERSION, 'kind': kind, 'tables': TABLES_VERSION, 'category_shift': CATEGORY_SHIFT}
+    return {'format': FORMAT_VERSION, 'kind': kind, 'version': version}
+
+
+def write_tables(path=None, tables=None, kind=EVALUATOR, version=None):
+    """Write the tables ({name: ints}, all the evaluator tables by default) to path and return the header.
+
+    Files of another kind than the evaluator tables carry their own version instead of the evaluator's.
+    The file is written next to path and renamed over it, so a process loading it never sees half a file.
+    """
+    path = path or TABLE_PATH
+    if tables is None:
+        assert kind == EVALUATOR, 'Value Error: the tables of a {} file must be given'.format(kind)
+        tables = build_tables()
+    # Sorted by name, the order of the JSON header the checksum is verified in.
+    arrays = {name: _uint32(tables[name]) for name in sorted(tables)}
+    header = dict(_expected_version(kind, version), arrays={})
+    offset = 0
+    checksum = hashlib.sha256()
+    for name, values in arrays.items():
+        header['arrays'][name] = {'offset': offset, 'length': len(values)}
+        checksum.update(values.tobytes())
+        offset += -(-len(values) * 4 // ALIGNMENT) * ALIGNMENT
+    header['sha256'] = checksum.hexdigest()
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.tables-')
+    # mkstemp creates the file for its owner only, give it the mode of a file created with open().
+    umask = os.umask(0)
+    os.umask(umask)
+    try:
+        os.chmod(temporary, 0o666 & ~umask)
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(MAGIC + len(header_bytes).to_bytes(4, 'little') + header_bytes)
+            for name, values in arrays.items():
+                file.seek(data_start + header['arrays'][name]['offset'])
+                file.write(values.tobytes())
+            file.truncate(data_start + offset)
+        os.replace(temporary, path)
+        _STORED.pop(path, None)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return header
+
+
+class TableFile:
+    # The arrays of a mapped table file, indexed by name. Arrays missing from the file are built on first use.
+    def __init__(self, path, header, buffer, data_start, numpy=False):
+        self.path = path
+        self.header = header
+        self._buffer = buffer
+        self._data_start = data_start
+        self._numpy = numpy
+        self._arrays = {}
+
+    def __getitem__(self, name):
+        values = self._arrays.get(name)
+        if values is None:
+            values = self._arrays[name] = self._view(name)
+        return values
+
+    def _view(self, name):
+        entry = self.header['arrays'].get(name)
+        if entry is None:
+            assert name in BUILDERS, 'Value Error: no table named {}'.format(name)
+            values = array.array('I', BUILDERS[name]())
+            if self._numpy:
+                import numpy as np
+                return np.frombuffer(values, dtype=np.uint32)
+            return memoryview(values)
+        start = self._data_start + entry['offset']
+        if self._numpy:
+            # A read-only numpy view of the shared mapping, no copy.
+            import numpy as np
+            return np.frombuffer(self._buffer, dtype='<u4', count=entry['length'], offset=start)
+        values = memoryview(self._buffer)[start:start + entry['length'] * 4].cast('I')
+        if sys.byteorder != 'little':
+            # The file is little-endian, a big-endian platform reads a swapped copy.
+            values = _uint32(values)
+        return values
+
+    def __contains__(self, name):
+        return name in self.header['arrays']
+
+    def names(self):
+        return list(self.header['arrays'])
+
+    def rank_table(self):
+        # The rank table on the mapped arrays, in place of the dict HandEvaluator builds without a file.
+        return MappedRankTable(*(self[name] for name in RANK_HASH_NAMES))
+
+    def numpy_view(self):
+        # The same file with numpy arrays, sharing the mapping.
+        return TableFile(self.path, self.header, self._buffer, self._data_start, numpy=True)
+
+    def __repr__(self):
+        return 'TableFile({!r}, {})'.format(self.path, self.names())
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        start = file.read(len(MAGIC) + 4)
+        assert len(start) == len(MAGIC) + 4 and start[:len(MAGIC)] == MAGIC, \
+            'Value Error: {} is not a table file'.format(path)
+        header_length = int.from_bytes(start[len(MAGIC):], 'little')
+        header = json.loads(file.read(header_length))
+    header['data_start'] = -(-(len(MAGIC) + 4 + header_length) // ALIGNMENT) * ALIGNMENT
+    return header
+
+
+def _kind_of(path):
+    # The kind of the table file at path, None when there is no readable table file.
+    try:
+        return read_header(path).get('kind')
+    except (OSError, ValueError, AssertionError):
+        return None
+
+
+def _check(path, verify, kind=EVALUATOR, version=None):
+    # Return the header of a valid and current table file of the kind, or None.
+    try:
+        header = read_header(path)
+    except (OSError, ValueError, AssertionError):
+        return None
+    if any(header.get(key) != value for key, value in _expected_version(kind, version).items()):
+        return None
+    data_start = header['data_start']
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        end = max([data_start + entry['offset'] + entry['length'] * 4 for entry in header['arrays'].values()] + [0])
+        if len(buffer) < end:
+            return None
+        if verify:
+            checksum = hashlib.sha256()
+            for entry in header['arrays'].values():
+                start = data_start + entry['offset']
+                checksum.update(buffer[start:start + entry['length'] * 4])
+            if checksum.hexdigest() != header['sha256']:
+                return None
+    finally:
+        buffer.close()
+    return header
+
+
+def load_tables(path=None, verify=True, build=True, numpy=False, kind=EVALUATOR, version=None):
+    """Map the table file at path (TABLE_PATH by default) and return a TableFile.
+
+    verify checks the SHA-256 of the data and kind and version say which file is expected. A missing, stale
+    or corrupt evaluator file is rebuilt when build is True, else an AssertionError is raised; files of other
+    kinds are never rebuilt, and neither is a file of another kind found at path. numpy=True returns numpy
+    arrays on the mapping instead of memoryviews.
+    """
+    path = path or TABLE_PATH
+    header = _check(path, verify, kind, version)
+    if header is None:
+        found = _kind_of(path)
+        assert found in (None, kind), 'Value Error: {} holds {} tables, not {}'.format(path, found, kind)
+        assert build and kind == EVALUATOR, 'Value Error: {} is missing, stale or corrupt'.format(path)
+        write_tables(path)
+        header = _check(path, False)
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return TableFile(path, header, buffer, header['data_start'], numpy)
+
+
+# {path: TableFile or None} of the files looked up by stored_tables, None for a missing or stale file.
+_STORED = {}
+
+
+def stored_tables(path=None):
+    # The TableFile of an existing, valid table file, None when there is none. Looked up once per path and
+    # process, write_tables forgets the path it writes.
+    path = path or TABLE_PATH
+    if path not in _STORED:
+        tables = None
+        if os.path.exists(path):
+            try:
+                tables = load_tables(path, build=False)
+            except AssertionError:
+                pass
+        _STORED[path] = tables
+    return _STORED[path]
+
+
+def stored_rank_table(path=None):
+    # The MappedRankTable of the table file, None when there is no valid file. Used by get_rank_table.
+    tables = stored_tables(path)
+    return tables.rank_table() if tables is not None else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect the hand evaluator table file.')
+    parser.add_argument('command', choices=('build', 'verify', 'info'))
+    parser.add_argument('--path', default=None, help='table file, {} by default'.format(TABLE_PATH))
+    parser.add_argument('--force', action='store_true', help='rebuild even when the file is current')
+    args = parser.parse_args(argv)
+    path = args.path or TABLE_PATH
+
+    if args.command == 'build':
+        assert _kind_of(path) in (None, EVALUATOR), 'Value Error: {} holds other tables'.format(path)
+        if args.force or _check(path, True) is None:
+            write_tables(path)
+            print('wrote {}'.format(path))
+        else:
+            print('{} is current'.format(path))
+    elif args.command == 'verify':
+        if _check(path, True) is None:
+            print('{} is missing, stale or corrupt'.format(path))
+            return 1
+        print('{} is valid'.format(path))
+    else:
+        header = read_header(path)
+        print('{} ({} bytes)'.format(path, os.path.getsize(path)))
+        print(', '.join('{} {}'.format(key.replace('_', ' '), header[key])
+                        for key in ('kind', 'format', 'version', 'tables', 'category_shift') if key in header))
+        for name, entry in header['arrays'].items():
+            print('  {:<20} {:>8} values at {}'.format(name, entry['length'], header['data_start'] + entry['offset']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
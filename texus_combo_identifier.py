@@ -5,7 +5,8 @@ Potential update 1: identify all combos in a set of cards
 Potential update 2: identify all potential combos given ignoring degeneracy.  
 
 """
-from cards_properties import Card, Cards, Deck
+from cards_property import Card, Cards, Deck
+from hand_evaluator import HandEvaluator, CATEGORY_SHIFT, STRAIGHT_TABLE, STRAIGHTS_TABLE, pack_ranks, straight_ranks
 import itertools
 
 class ComboIdentifier:
@@ -13,148 +14,102 @@ class ComboIdentifier:
     ALL_COMBOS = ['High Card', 'Pair', 'Two-pair', 'Three of a kind', 'Straight', 'Flush', 'Full house', 'Four of a kind', 'Straight flush']
     SUITS = ['square', 'club', 'heart', 'spade']
 
-    def __init__(self):
-        pass
+    def __init__(self, evaluator=None, cache=None):
+        # find_high_combo delegates to the table driven evaluator, pass evaluator=False to run the isX checks instead.
+        # cache is an optional EvaluationCache the evaluator path looks the strength and the best five cards up in.
+        if evaluator is None:
+            evaluator = HandEvaluator()
+        assert cache is None or evaluator, 'Value Error: the cache only works with the evaluator, not evaluator=False'
+        self.evaluator = evaluator
+        self.cache = cache
 
-    # def pick_five_all(self, cards):
-    #     # Return a list of all combination of five cards from the Cards input.
-    #     cards.sort(key='rank', reverse=True)
-    #     five_cards_all = list(itertools.combinations(cards, 5))
-    #     for index, five_cards in enumerate(five_cards_all):
-    #         five_cards_all[index] = Cards(cards=list(five_cards))
-    #     return five_cards_all
-    
     def unique(self, lst):
         # extract the unique elements in a list and return in a list.
         return list(set(lst))
 
-    # Checking functions. 
-    def isStraight(self, cards):
-    # Check whether the cards input contain 5 consecutive ranks, return the greatest conseutive ranks if True, else return False.
+    def analyse(self, cards):
+        # Return the shared rank and suit analysis of the cards, see CardsAnalysis.
         if isinstance(cards, list):
             cards = Cards(cards=cards)
-        unique_ranks = sorted(self.unique(cards.ranks))
-        if len(unique_ranks) < 5:
-            return False
-        for i in range(4, len(unique_ranks)):
-            if unique_ranks[i] - unique_ranks[i-4] == 4:
-                return True
-        # Check for A
-        if unique_ranks[-1] == 14 and unique_ranks[3] == 5:
-            return True
-        return False
+        return cards.analysis
+
+    # Checking functions. 
+    # The straights come from the 13-bit rank mask of the cards (rank 2 at bit 0): STRAIGHTS_TABLE lists the top
+    # rank of every straight in a mask and STRAIGHT_TABLE the highest one, A2345 has the top rank 5.
+    def isStraight(self, cards):
+    # Check whether the cards input contain 5 consecutive ranks.
+        return STRAIGHT_TABLE[self.analyse(cards).rank_mask] > 0
+
+    def straight_window(self, top):
+        # The ranks of the straight topped by top from the lowest, A2345 starts with the A.
+        return straight_ranks(top)[::-1]
 
     def find_straight(self, cards):
-        # Return the cards that can form a straight. 
+        # Return the cards that can form a straight, grouped by rank from the lowest. A rank with one card holds the
+        # card, a rank with more holds the list of its cards from the lowest suit.
         if isinstance(cards, list):
             cards = Cards(cards=cards)
         if self.isStraight(cards):
-            consecutive = []
             cards.sort(key='rank')
-            # Extract the ranks that are in consecutive order.
-            unique_ranks = self.unique(cards.ranks)
-            for i in range(len(unique_ranks)-4):
-                if unique_ranks[i+4] - unique_ranks[i] == 4:
-                    consecutive = consecutive + unique_ranks[i:i+5]
-            if unique_ranks[-1] == 14 and unique_ranks[3] == 5:
-                if consecutive == []:
-                    consecutive = [2, 3, 4, 5, 14]
-                else:
-                    if 14 not in consecutive:
-                        consecutive.append(14)
-            consecutive=self.unique(consecutive)
-            # Extract the cards that match the current ranks in consecutive
-            straight = [[] for i in range(len(consecutive))]
-            for card in cards:
-                if card.rank in consecutive:
-                    # For cards of the same rank in different suits.
-                    if cards.count(key='rank', target=card.rank) > 1:
-                        straight[consecutive.index(card.rank)].append(card)
-                    else:
-                        straight[consecutive.index(card.rank)] = card
+            analysis = self.analyse(cards)
+            consecutive = set()
+            for top in STRAIGHTS_TABLE[analysis.rank_mask]:
+                consecutive.update(straight_ranks(top))
+            straight = []
+            for rank in sorted(consecutive):
+                rank_cards = analysis.by_rank[rank][::-1]
+                straight.append(rank_cards if len(rank_cards) > 1 else rank_cards[0])
             return straight
         return None
             
     def find_high_straight(self, cards, tiebreaker='default', reverse=True):
-        # Return the highest straight. 
-        if isinstance(cards, list):
-            cards = Cards(cards=cards)
-        straight = self.find_straight(cards)
-        if straight is not None:
-            for index, card in enumerate(straight):
-                if isinstance(card, list):
-                    straight[index] = card[-1]
-                    if tiebreaker == 'reverse':
-                        straight[index] = card[0]
-            # Consider A2345 as well 
-            if straight[-1].rank - straight[-2].rank > 1:
-                if len(straight[1:6]) < 5:
-                    high_straight = straight[-1:] + straight[:4] 
-                else:
-                    high_straight = straight[-6:-1]
-            else:
-                high_straight = straight[-5:]
-            if reverse:
+        # Return the highest straight, from its highest card unless reverse is False. Of the cards of equal rank the
+        # highest suit is used, the lowest with tiebreaker='reverse'.
+        top = STRAIGHT_TABLE[self.analyse(cards).rank_mask]
+        if top:
+            by_rank = self.analyse(cards).by_rank
+            pick = -1 if tiebreaker == 'reverse' else 0
+            high_straight = [by_rank[rank][pick] for rank in straight_ranks(top)]
+            if not reverse:
                 high_straight.reverse()
             return high_straight 
         return None    
 
     def find_all_straight(self, cards):
         # Return all combinations of straight. The result groups all degenerated straight in a list. 
-        straight = self.find_straight(cards)
-        if straight is not None:
-            straight = self.convert_to_list(straight)
+        if isinstance(cards, list):
+            cards = Cards(cards=cards)
+        analysis = self.analyse(cards)
+        tops = STRAIGHTS_TABLE[analysis.rank_mask]
+        if tops:
             all_straight = []
-            for index in range((len(straight)-4)):
-                five_cards = straight[index: index+5]
-                if self.isStraight([card[0] for card in five_cards]):
-
-                    # avoid adding A2345 to other striaght
-                    if five_cards[-1][0].rank - five_cards[-2][0].rank == 1:
-                        all_straight.append([])
-
-                        all_straight[-1] = list(itertools.product(*five_cards))
-                        for straight_index, current_straight in enumerate(all_straight[-1]):
-                            all_straight[-1][straight_index] = Cards(current_straight)
-                            all_straight[-1][straight_index].cards.reverse()
-
-            if straight[-1][0].rank == 14 and straight[3][0].rank==5:
-                straight_Afive = straight[:4]
-                straight_Afive.insert(0, straight[-1])
-                straight_Afive = self.convert_to_list(straight_Afive)
-                straight_Afive = list(itertools.product(*straight_Afive))
-                for straight_index, current_straight in enumerate(straight_Afive):
-                    straight_Afive[straight_index] = Cards(current_straight)
-                    straight_Afive[straight_index].cards.reverse()
-                all_straight.insert(0, straight_Afive)
-            
-            all_straight.reverse()
+            for top in tops:
+                rank_cards = [analysis.by_rank[rank][::-1] for rank in self.straight_window(top)]
+                all_straight.append([])
+                for current_straight in itertools.product(*rank_cards):
+                    all_straight[-1].append(Cards(list(current_straight)[::-1]))
             return all_straight
         return None
     
     def convert_to_list(self, cards, type=Card):
-        # Convert a single card to a list, for use in find_all_straight.
+        # Convert a single card to a list. find_all_straight no longer needs it, it is kept for the callers of
+        # the original public API.
         for index, card in enumerate(cards):
             if isinstance(card, type):
                 cards[index] = [card]
         return cards
 
     def isFlush(self, cards):
-        for i in range(4):
-            if cards.count(key='suit', target=i) >= 5:
-                return True
-        return False
+        return max(self.analyse(cards).suit_counts) >= 5
     
     def find_flush(self, cards):
         # Return the 5 cards that form the highest flush, return spades, hearts, clubs and squares if tie by default.
         # tiebreaker options: default, reverse, spades, hearts, clubs, squares
         if self.isFlush(cards):
             flush = [[] for i in range(4)]
-            for i in range(4):
-                count = cards.count(key='suit', target=i)
-                if count >= 5:
-                    cards.sort(key=self.SUITS[i], reverse=True)
-                    flush[i] = cards.cards[0:count]
+            for i, suit_cards in enumerate(self.analyse(cards).by_suit):
+                if len(suit_cards) >= 5:
+                    flush[i] = list(suit_cards)
             return flush
         
         return None
@@ -197,67 +152,54 @@ class ComboIdentifier:
         else:
             return None
     
+    def straight_flush_tops(self, cards):
+        # Return [(top rank, suit)] of every straight flush, from the highest straight and the lowest suit.
+        analysis = self.analyse(cards)
+        tops = []
+        for suit, suit_mask in enumerate(analysis.suit_rank_masks):
+            if analysis.suit_counts[suit] >= 5:
+                tops.extend((top, suit) for top in STRAIGHTS_TABLE[suit_mask])
+        return sorted(tops, key=lambda top: (-top[0], top[1]))
+
     def isStraightFlush(self, cards):
-        flush = self.find_flush(cards)
-        if flush:
-            for flushable in flush:
-                if flushable and self.isStraight(flushable):
-                    return True
-        return False    
+        analysis = self.analyse(cards)
+        return any(STRAIGHT_TABLE[suit_mask] for suit, suit_mask in enumerate(analysis.suit_rank_masks)
+                   if analysis.suit_counts[suit] >= 5)
                     
     def find_high_straight_flush(self, cards, tiebreaker='default'):
-        if self.isStraightFlush(cards):
-            flush = self.find_flush(cards)
-            straight_flush = None
-            for flushable in flush:
-                if flushable and self.isStraight(flushable):
-                    current_straight_flush = self.find_high_straight(flushable)
-                    if not straight_flush:
-                        straight_flush = current_straight_flush
-                    else:
-                        if current_straight_flush[0].rank > straight_flush[0].rank:
-                            straight_flush = current_straight_flush
-                        if current_straight_flush[0] == current_straight_flush[0]:
-                            if tiebreaker == 'default':
-                                straight_flush = current_straight_flush
-            return straight_flush
+        # Of two straight flushes of the same rank, the one of the higher suit by default.
+        tops = self.straight_flush_tops(cards)
+        if tops:
+            high_top = tops[0][0]
+            suits = [suit for top, suit in tops if top == high_top]
+            suit = suits[0] if tiebreaker == 'reverse' else suits[-1]
+            by_rank = self.analyse(cards).by_rank
+            return [[card for card in by_rank[rank] if card.suit == suit][0] for rank in straight_ranks(high_top)]
         return None
 
     def find_all_straight_flush(self, cards):
-        if self.isFlush(cards) and self.isStraight(cards):
-            straight_flush = []
-            for straight in self.find_all_straight(cards):
-                for individual in straight:
-                    if self.isFlush(individual):
-                        straight_flush.append(individual)
-            if straight_flush != []:
-                return straight_flush
-
+        tops = self.straight_flush_tops(cards)
+        if tops:
+            by_rank = self.analyse(cards).by_rank
+            return [Cards([[card for card in by_rank[rank] if card.suit == suit][0] for rank in straight_ranks(top)])
+                    for top, suit in tops]
         return None
     
     def extract_n(self, cards, number):
         # Return cards of n equal ranks in the given sets of cards. 
-        cards.sort(key='rank', reverse=True)
-        unique_ranks = sorted(self.unique(cards.ranks))
+        analysis = self.analyse(cards)
     
         extracted = {}
-        for rank in unique_ranks:
-            n_card = cards.count(key='rank', target=rank)
+        for rank in analysis.unique_ranks:
+            n_card = analysis.rank_counts[rank]
             if  n_card >= number:
-                try:
-                    extracted[n_card][rank] = []
-                except KeyError:
-                    extracted[n_card] = {}
-                    extracted[n_card][rank] = []
-                for card in cards:
-                    if card.rank == rank:
-                        extracted[n_card][rank].append(card)
+                extracted.setdefault(n_card, {})[rank] = list(analysis.by_rank[rank])
         if extracted != {}:
             return extracted
         return None
 
     def isFourOfaKind(self, cards):
-        return any(cards.count(key='rank', target=card.rank) == 4 for card in cards)
+        return 4 in self.analyse(cards).rank_counts
     
     def find_four_of_a_kind(self, cards):
         if self.isFourOfaKind(cards):
@@ -317,7 +259,7 @@ class ComboIdentifier:
         return None
 
     def isThreeOfaKind(self, cards):
-        return any(cards.count(key='rank', target=card.rank) >= 3 for card in cards)
+        return max(self.analyse(cards).rank_counts) >= 3
 
     def find_three_of_a_kind(self, cards):
         if self.isThreeOfaKind(cards):
@@ -373,7 +315,7 @@ class ComboIdentifier:
         return None
 
     def isPair(self, cards):
-        return any(cards.count(key='rank', target=card.rank) >= 2 for card in cards)
+        return max(self.analyse(cards).rank_counts) >= 2
 
     def find_pair(self, cards):
         if self.isPair(cards):
@@ -395,6 +337,8 @@ class ComboIdentifier:
         return None
 
     def find_high_combo(self, cards):
+        if self.evaluator:
+            return self.evaluate_high_combo(cards)
         if self.isStraightFlush(cards):
             return Combo(self.find_high_straight_flush(cards), 8)
         if self.isFourOfaKind(cards):
@@ -414,97 +358,139 @@ class ComboIdentifier:
         cards.sort(key='rank', reverse=True)
         return Combo(cards.cards[:5], 0)
 
-    # TODO: return all combos that can be formed by the cards. 
-    # def find_all_combos(self, cards):
-    #     all_comb = self.pick_five_all(cards)
-    #     combos = {}
-    
-    # TODO: Find the possible combos given a set of cards.
-    def find_possible_combos(self, cards, n_cards, cards_remain=None):
+    def evaluate_high_combo(self, cards):
+        # Same result as the isX checks, computed from the lookup tables of the evaluator. The input is not sorted.
+        if isinstance(cards, list):
+            cards = Cards(cards=cards)
+        by_num = {card.num: card for card in cards.cards}
+        if self.cache is not None:
+            strength, five = self.cache.best(by_num)
+        else:
+            strength = self.evaluator.evaluate(by_num)
+            five = self.evaluator.best_five(by_num, strength)
+        return Combo([by_num[num] for num in five], strength >> CATEGORY_SHIFT, strength)
+
+    def find_all_combos(self, cards, orders=None, min_strength=None):
+        # Yield every 5 cards Combo in the cards, one at a time, from the highest ranked cards.
+        # orders keeps the given combo orders (numbers or names in ALL_COMBOS) and min_strength (a strength or a
+        # Combo) the combos at least that strong. The whole set bounds every 5 cards in it and the flushes and
+        # straights can only use the cards of a flush suit or of a straight, so the rest is never enumerated.
+        if isinstance(cards, list):
+            cards = Cards(cards=cards)
+        evaluator = self.evaluator or HandEvaluator()
+        if isinstance(min_strength, Combo):
+            min_strength = min_strength.strength
+        if orders is not None:
+            orders = set(self.ALL_COMBOS.index(order) if isinstance(order, str) else order for order in orders)
+        by_num = {card.num: card for card in cards.cards}
+        best = evaluator.evaluate(by_num)
+        if min_strength is not None and best < min_strength:
+            return
+        if orders is not None:
+            orders = set(order for order in orders if order <= best >> CATEGORY_SHIFT)
+            if not orders:
+                return
+
+        analysis = cards.analysis
+        nums = sorted(by_num, key=lambda num: (by_num[num].rank, by_num[num].suit), reverse=True)
+        if orders is not None and orders <= {4, 5, 8}:
+            pool = set()
+            if orders & {5, 8}:
+                pool.update(num for num in nums if analysis.suit_counts[num // 13] >= 5)
+            if 4 in orders:
+                consecutive = set()
+                for top in STRAIGHTS_TABLE[analysis.rank_mask]:
+                    consecutive.update(straight_ranks(top))
+                pool.update(num for num in nums if by_num[num].rank in consecutive)
+            nums = [num for num in nums if num in pool]
+
+        for five in itertools.combinations(nums, 5):
+            strength = evaluator.evaluate(five)
+            if orders is not None and strength >> CATEGORY_SHIFT not in orders:
+                continue
+            if min_strength is not None and strength < min_strength:
+                continue
+            yield Combo([by_num[num] for num in evaluator.best_five(five, strength)], strength >> CATEGORY_SHIFT, strength)
+
+    def iter_possible_combos(self, cards, n_cards, cards_remain=None):
+        # Yield (added cards, Combo) for every way of adding cards until there are n_cards, one at a time.
+        if not cards_remain:
+            cards_remain = Cards(cardset=Deck().cardset - cards.cardset)
+        missing = n_cards - len(cards)
+        cards_remain.sort(key='rank', reverse=True)
+        for comb in itertools.combinations(cards_remain.cards, missing):
+            added = Cards(cards=list(comb)) if comb else Cards()
+            yield added, self.find_high_combo(Cards(cards.cards + added.cards))
+
+    def find_possible_combos(self, cards, n_cards, cards_remain=None, callback=None, stop=None):
+        # Return the best combo of each order that adding cards until there are n_cards can reach.
+        # The combinations are streamed, only the best one of each order is kept. callback(added, combo) is
+        # called for every combination and the search ends early as soon as stop(added, combo) returns True.
+        if len(cards) > n_cards:
+            return self.find_high_combo(cards)
         if not cards_remain:
-            deck = Deck()
-            cards_remain = deck.remove(cards) 
-        if len(cards) <= n_cards:
-            # Add cards to cards until it's the target's length
+            cards_remain = Cards(cardset=Deck().cardset - cards.cardset)
+        possible_combos = {}
+        if self.evaluator and callback is None and stop is None:
+            # Only compare strengths and build the Combo of the best combination of each order at the end.
             missing = n_cards - len(cards)
             cards_remain.sort(key='rank', reverse=True)
-            missing_cards = list(itertools.combinations(cards_remain, missing))
-            for index, comb in enumerate(missing_cards):
-                missing_cards[index] = Cards(comb)
-            possible_combos = {}
-            for comb in missing_cards:
-                combined = Cards(cards.cards + comb.cards)
-                combined_combo = self.find_high_combo(combined)
-                try:
-                    if combined_combo > possible_combos[combined_combo.order]:
-                        possible_combos[combined_combo.order]=combined_combo
-                except KeyError:
-                    possible_combos[combined_combo.order]=combined_combo
-            possible_combos = dict(sorted(possible_combos.items(), key=lambda combo: combo[1], reverse=True))
-            return possible_combos
-        return self.find_high_combo(cards)
+            nums = tuple(card.num for card in cards.cards)
+            evaluate = self.evaluator.evaluate
+            best = {}
+            for comb in itertools.combinations(cards_remain.cards, missing):
+                strength = evaluate(nums + tuple(card.num for card in comb))
+                order = strength >> CATEGORY_SHIFT
+                if order not in best or strength > best[order][0]:
+                    best[order] = (strength, comb)
+            for order, (strength, comb) in best.items():
+                possible_combos[order] = self.find_high_combo(Cards(cards.cards + list(comb)))
+        else:
+            for added, combined_combo in self.iter_possible_combos(cards, n_cards, cards_remain):
+                if combined_combo.order not in possible_combos or combined_combo > possible_combos[combined_combo.order]:
+                    possible_combos[combined_combo.order] = combined_combo
+                if callback is not None:
+                    callback(added, combined_combo)
+                if stop is not None and stop(added, combined_combo):
+                    break
+        possible_combos = dict(sorted(possible_combos.items(), key=lambda combo: combo[1], reverse=True))
+        return possible_combos
 
 class Combo:
     ALL_COMBOS = ['High Card', 'Pair', 'Two-pair', 'Three of a kind', 'Straight', 'Flush', 'Full house', 'Four of a kind', 'Straight flush']
 
-    def __init__(self, cards, order):
+    def __init__(self, cards, order, strength=None):
+        # strength is the integer key of the combo (see hand_evaluator): the order followed by the ranks of the
+        # cards, which are in order of significance. All the comparisons and the hash go through it.
         if not isinstance(cards, Cards):
             cards = Cards(cards=cards)
         self.cards = cards
         self.order = order
         self.name = self.ALL_COMBOS[self.order]
+        if strength is None:
+            strength = (order << CATEGORY_SHIFT) | pack_ranks([card.rank for card in cards.cards])
+        self.strength = strength
 
     def __eq__(self, anotherCombo):
-        if self.order == anotherCombo.order:
-            return self.cards == anotherCombo.cards
-        return self.order == anotherCombo.order 
+        return self.strength == anotherCombo.strength
     
     def __ne__(self, anotherCombo):
-        if self.order == anotherCombo.order:
-            return self.cards != anotherCombo.cards
-        return self.order != anotherCombo.order
+        return self.strength != anotherCombo.strength
 
     def __gt__(self, anotherCombo):
-        if self.order == anotherCombo.order:
-            for index, card in enumerate(self.cards):
-                if card == anotherCombo.cards.cards[index]:
-                    if index == 4: 
-                        return False
-                    continue
-                return card > anotherCombo.cards.cards[index]
-                    
-        return self.order > anotherCombo.order
+        return self.strength > anotherCombo.strength
     
     def __ge__(self, anotherCombo):
-        if self.order == anotherCombo.order:
-            for index, card in enumerate(self.cards):
-                if card == anotherCombo.cards.cards[index]:
-                    if index == 4: 
-                        return True
-                    continue
-                return card > anotherCombo.cards.cards[index]
-
-        return self.order > anotherCombo.order
+        return self.strength >= anotherCombo.strength
 
     def __lt__(self, anotherCombo):
-        if self.order == anotherCombo.order:
-            for index, card in enumerate(self.cards):
-                if card == anotherCombo.cards.cards[index]:
-                    if index == 4: 
-                        return False
-                    continue
-                return card < anotherCombo.cards.cards[index]
-        return self.order < anotherCombo.order
+        return self.strength < anotherCombo.strength
 
     def __le__(self, anotherCombo):
-        if self.order == anotherCombo.order:
-            for index, card in enumerate(self.cards):
-                if card == anotherCombo.cards.cards[index]:
-                    if index == 4: 
-                        return True
-                    continue
-                return card < anotherCombo.cards.cards[index]
-        return self.order < anotherCombo.order
+        return self.strength <= anotherCombo.strength
+
+    def __hash__(self):
+        return self.strength
 
     def __str__(self):
         return '{}: {}'.format(self.name, self.cards)
@@ -536,4 +522,58 @@ def testing():
 
 
 
-# testing()
+def testing_legacy(number=20000, seed=1):
+    # The isX / find_X outputs on seeded hands hash to the digest of the original implementation, and the
+    # evaluator path agrees with them. The original calls two three of a kinds "Three of a kind", the
+    # evaluator finds the full house they make.
+    import hashlib
+    import random
+
+    def plain(value):
+        if isinstance(value, Combo):
+            return [value.order, plain(value.cards)]
+        if isinstance(value, Cards):
+            return plain(value.cards)
+        if isinstance(value, (list, tuple, dict)):
+            return [(str(key), plain(item)) for key, item in value.items()] if isinstance(value, dict) \
+                else [plain(item) for item in value]
+        return value.num if isinstance(value, Card) else value
+
+    LEGACY_DIGEST = '809c7414b216ad686beb7013f2b1dd56af289c6a0878c8155daf03fd68948912'
+    legacy = ComboIdentifier(evaluator=False)
+    methods = ('isStraight find_straight find_high_straight find_all_straight isFlush find_flush find_high_flush '
+               'find_all_flush isStraightFlush find_high_straight_flush find_all_straight_flush extract_n '
+               'isFourOfaKind find_four_of_a_kind find_high_four_of_a_kind isFullHouse find_high_full_house '
+               'isThreeOfaKind find_three_of_a_kind find_high_three_of_a_kind isTwoPair find_two_pair '
+               'find_high_two_pair isPair find_pair find_high_pair find_high_combo').split()
+    rng = random.Random(5)
+    digest = hashlib.sha256()
+    for index in range(3000):
+        n_cards = rng.choice([5, 6, 7])
+        # A third of the hands hold a flush, a third a pair or more.
+        nums = rng.sample(range(52), n_cards)
+        if index % 3 == 0:
+            suit = rng.randrange(4)
+            nums = list(dict.fromkeys([suit * 13 + rank for rank in rng.sample(range(13), 5)] + nums))[:n_cards]
+        elif index % 3 == 1:
+            rank = rng.randrange(13)
+            nums = list(dict.fromkeys([suit * 13 + rank for suit in rng.sample(range(4), rng.choice([2, 3, 4]))]
+                                      + nums))[:n_cards]
+        for method in methods:
+            args = (Cards(cardnums=nums),) + ((2,) if method == 'extract_n' else ())
+            digest.update(repr((nums, method, plain(getattr(legacy, method)(*args)))).encode())
+    assert digest.hexdigest() == LEGACY_DIGEST, 'the legacy outputs changed: {}'.format(digest.hexdigest())
+
+    identify = ComboIdentifier()
+    rng = random.Random(seed)
+    two_trips = 0
+    for index in range(number):
+        cards = Cards(cardnums=rng.sample(range(52), rng.choice([5, 6, 7])))
+        expected = legacy.find_high_combo(cards)
+        combo = identify.find_high_combo(cards)
+        if expected.order == 3 and combo.order == 6 and len(identify.extract_n(cards, 3).get(3, {})) == 2:
+            two_trips += 1
+            continue
+        assert [card.num for card in combo.cards.cards] == [card.num for card in expected.cards.cards], cards
+        assert combo.strength == expected.strength, (cards, expected, combo)
+    print('{} hands agree, {} with two three of a kinds'.format(number, two_trips))